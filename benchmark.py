@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：启动本地夹具服务器模拟慕课网页面，将工具指向该服务器后
+运行冷启动、缓存命中、并发调用、大 limit 等场景，输出耗时分布与内存占用。
+
+    python benchmark.py                         # 运行全部场景
+    python benchmark.py --scenarios warm_cache,concurrent --iterations 50
+    python benchmark.py serve --port 8765       # 仅启动夹具服务器
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from tracing import percentile, setup_logging
+
+# 统计浏览器子进程内存为可选功能
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# 分页列表的总页数，超过后返回空列表页
+FIXTURE_PAGES = int(os.environ.get("BENCH_PAGES", "10"))
+SCENARIOS = ("cold_start", "warm_browser", "warm_cache", "concurrent", "large_limit")
+
+# site_profile 路由 → (夹具文件, 是否分页)；内容列表页的 {{type}} 取路由名前缀
+FIXTURE_ROUTES = {
+    "home": ("home.html", False),
+    "search_course": ("search_course.html", True),
+    "course_search_list": ("course_list.html", True),
+    "teacher_courses": ("course_list.html", True),
+    "recommend_free": ("course_list.html", True),
+    "recommend_real": ("course_list.html", True),
+    "recommend_system": ("open_course.html", False),
+    "comment_list": ("content_list.html", False),
+    "column_list": ("content_list.html", False),
+    "tutorial_list": ("content_list.html", False),
+    "note_list": ("content_list.html", False),
+}
+
+
+def _load_fixtures() -> Dict[str, str]:
+    fixtures = {}
+    for name in os.listdir(FIXTURE_DIR):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def _route_path(profile, route: str) -> str:
+    return urlsplit(profile.routes[route]).path.rstrip("/") or "/"
+
+
+def make_handler(fixtures: Dict[str, str], profile, delay_ms: float):
+    """按站点配置中的路由创建请求处理类，delay_ms 模拟网络延迟"""
+    paths = {}
+    for route, (name, paged) in FIXTURE_ROUTES.items():
+        paths.setdefault(_route_path(profile, route), (name, paged, route.split("_")[0]))
+    detail_re = re.compile("^" + re.escape(_route_path(profile, "course_detail")).replace(re.escape("{query}"), r"(\d+)") + "$")
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def _render(self):
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            path = parts.path.rstrip("/") or "/"
+
+            if path in paths:
+                name, paged, content_type = paths[path]
+                page_no = int(query.get("page", ["1"])[0])
+                if paged and page_no > FIXTURE_PAGES:
+                    return fixtures["empty_list.html"]
+                return fixtures[name].replace("{{page}}", str(page_no)).replace("{{type}}", content_type)
+            match = detail_re.match(path)
+            if match:
+                return fixtures["course_detail.html"].replace("{{id}}", match.group(1))
+            return None
+
+        def do_GET(self):
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000)
+            body = self._render()
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_fixture_server(port: int = 0, delay_ms: float = 0):
+    """
+    在后台线程中启动夹具服务器，返回 (server, base_url)。
+    同时设置 IMOOC_BASE_URL：站点配置在首次导入 site_profile 时编译，因此须在导入任何工具模块之前调用。
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), BaseHTTPRequestHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["IMOOC_BASE_URL"] = base_url
+    from site_profile import PROFILE
+
+    server.RequestHandlerClass = make_handler(_load_fixtures(), PROFILE, delay_ms)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def _rss_mb() -> Dict[str, float]:
+    """当前进程峰值 RSS，以及（安装 psutil 时）浏览器子进程的 RSS 合计"""
+    memory = {"python_max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if psutil is not None:
+        children = psutil.Process().children(recursive=True)
+        total = 0
+        for child in children:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        memory["browser_rss_mb"] = round(total / 1024 / 1024, 1)
+    return memory
+
+
+def _tool(obj) -> Callable:
+    """取出被 @mcp.tool() 包装前的函数"""
+    return getattr(obj, "fn", obj)
+
+
+async def _timed(samples: List[float], errors: List[str], call):
+    start = time.perf_counter()
+    try:
+        result = await call
+        # JSON 模式下工具以 {"error": ...} 报告失败
+        if isinstance(result, str) and result.startswith("{"):
+            payload = json.loads(result)
+            if "error" in payload:
+                errors.append(payload["error"])
+    except Exception as e:
+        errors.append(str(e))
+    samples.append((time.perf_counter() - start) * 1000)
+
+
+async def run_scenario(name: str, calls: List[Callable], concurrency: int = 1) -> Dict:
+    """执行一组调用并统计耗时分布、错误数和内存"""
+    samples, errors = [], []
+    tracemalloc.start()
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(make_call):
+        async with semaphore:
+            await _timed(samples, errors, make_call())
+
+    await asyncio.gather(*(worker(call) for call in calls))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {
+        "scenario": name,
+        "calls": len(samples),
+        "errors": len(errors),
+        "wall_s": round(wall, 2),
+        "throughput_per_s": round(len(samples) / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(samples, 50), 1),
+        "p95_ms": round(percentile(samples, 95), 1),
+        "p99_ms": round(percentile(samples, 99), 1),
+        "max_ms": round(max(samples), 1),
+        "python_peak_alloc_mb": round(peak / 1024 / 1024, 1),
+        **_rss_mb(),
+    }
+    if errors:
+        report["first_error"] = errors[0][:200]
+    return report
+
+
+def build_scenarios(rsq, iterations: int, concurrency: int) -> Dict[str, Dict]:
+    """场景名 → {calls, concurrency}；每个 call 返回一个新的协程"""
+    search = _tool(rsq.search_courses)
+    details = _tool(rsq.get_course_details)
+    teacher = _tool(rsq.search_courses_by_teacher)
+    contents = _tool(rsq.search_contents)
+    recommend = _tool(rsq.recommend_courses)
+    detail_url = lambda n: rsq.PROFILE.url("course_detail", n)
+
+    mixed = [
+        lambda i: search(f"bench concurrent {i}", 5, format="json"),
+        lambda i: details(detail_url(5000 + i)),
+        lambda i: teacher(f"bench teacher {i}", 5, format="json"),
+        lambda i: contents(f"bench {i}", "all", 5, format="json"),
+    ]
+    return {
+        # 首次调用包含浏览器启动与登录检查
+        "cold_start": {"calls": [lambda: search("bench cold", 5, format="json")], "concurrency": 1},
+        # 浏览器已启动，参数各不相同，不命中结果缓存
+        "warm_browser": {
+            "calls": [(lambda i=i: search(f"bench warm {i}", 5, format="json")) for i in range(iterations)]
+                     + [(lambda i=i: details(detail_url(3000 + i))) for i in range(iterations)],
+            "concurrency": 1,
+        },
+        # 相同参数重复调用，命中结果缓存
+        "warm_cache": {
+            "prime": lambda: search("bench cached", 5, format="json"),
+            "calls": [(lambda: search("bench cached", 5, format="json")) for _ in range(iterations)],
+            "concurrency": 1,
+        },
+        "concurrent": {
+            "calls": [(lambda i=i: mixed[i % len(mixed)](i)) for i in range(iterations)],
+            "concurrency": concurrency,
+        },
+        # 需要翻多页的大 limit 调用
+        "large_limit": {
+            "calls": [lambda: search("bench large", 100, format="json"),
+                      lambda: teacher("bench large", 100, format="json"),
+                      lambda: recommend("free", 100, format="json")],
+            "concurrency": 1,
+        },
+    }
+
+
+async def run_benchmarks(rsq, names: List[str], iterations: int, concurrency: int) -> Dict:
+    from tracing import trace_stats
+
+    scenarios = build_scenarios(rsq, iterations, concurrency)
+    reports = []
+    for name in names:
+        spec = scenarios[name]
+        if "prime" in spec:
+            await spec["prime"]()
+        print(f"[基准] 运行场景 {name}（{len(spec['calls'])} 次调用，并发 {spec['concurrency']}）...")
+        report = await run_scenario(name, spec["calls"], spec["concurrency"])
+        print(f"[基准] {name}: p50 {report['p50_ms']}ms，p95 {report['p95_ms']}ms，"
+              f"p99 {report['p99_ms']}ms，错误 {report['errors']}")
+        reports.append(report)
+
+    if rsq.browser_context is not None:
+        await rsq.browser_context.close()
+    await rsq.worker_pool.close()
+    await rsq.http_fetcher.close()
+    return {"scenarios": reports, "trace": trace_stats()}
+
+
+def _print_table(reports: List[Dict]):
+    columns = ("scenario", "calls", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+               "throughput_per_s", "python_peak_alloc_mb", "python_max_rss_mb")
+    print("\n" + " | ".join(columns))
+    for report in reports:
+        print(" | ".join(str(report.get(column, "")) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="慕课网抓取工具离线基准测试")
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "serve"))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--delay-ms", type=float, default=20, help="夹具服务器模拟的网络延迟")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--no-http", action="store_true", help="关闭 HTTP 直连，全部走浏览器")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数，0 表示在当前进程内执行")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.port, args.delay_ms)
+    if args.command == "serve":
+        print(f"夹具服务器已启动: {base_url}（设置 IMOOC_BASE_URL={base_url} 后运行 rsq.py）")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    # 必须在导入 rsq 之前设置环境变量：数据目录在导入时确定
+    workdir = tempfile.mkdtemp(prefix="imooc_bench_")
+    os.environ.update({
+        "BROWSER_DATA_DIR": os.path.join(workdir, "browser_data"),
+        "IMOOC_DATA_DIR": os.path.join(workdir, "data"),
+        "EAGER_BROWSER": "0",
+        "TRACE_LOG": "0",
+    })
+    os.environ.setdefault("HEADLESS", "1")
+    if args.no_http:
+        os.environ["HTTP_FAST_PATH"] = "0"
+    os.environ["WORKERS"] = str(args.workers)
+
+    setup_logging()
+    try:
+        import rsq
+        results = asyncio.run(run_benchmarks(rsq, names, args.iterations, args.concurrency))
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results["config"] = {"base_url": base_url, "delay_ms": args.delay_ms, "iterations": args.iterations,
+                         "concurrency": args.concurrency, "http_fast_path": not args.no_http,
+                         "workers": args.workers,
+                         "python": sys.version.split()[0]}
+    _print_table(results["scenarios"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+from playwright.async_api import async_playwright
+
+# 服务器部署时设置 HEADLESS=1，无需 X Server
+HEADLESS = os.environ.get("HEADLESS", "0") == "1"
+# MCP 服务启动时即在后台启动浏览器，首个请求无需等待
+EAGER_BROWSER = os.environ.get("EAGER_BROWSER", "0") == "1"
+
+# 关闭与抓取无关的后台功能，加快冷启动
+LAUNCH_ARGS = [
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-extensions",
+    "--disable-component-update",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-dev-shm-usage",
+]
+
+logger = logging.getLogger(__name__)
+
+
+async def launch_context(user_data_dir: str, **kwargs):
+    """启动 Playwright 并打开持久化浏览器上下文，返回 (playwright, context)"""
+    start = time.perf_counter()
+    pw = await async_playwright().start()
+    context = await pw.chromium.launch_persistent_context(
+        user_data_dir=user_data_dir,
+        headless=HEADLESS,
+        args=LAUNCH_ARGS,
+        **kwargs
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    logger.info("[启动] 浏览器启动完成，用时 %.0fms（headless=%s）", elapsed, HEADLESS)
+    return pw, context
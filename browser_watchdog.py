@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from tracing import count
+
+# 统计浏览器子进程内存为可选功能，未安装 psutil 时以各页面 JS 堆合计估算
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 内存检查间隔（秒），0 表示关闭巡检
+WATCHDOG_INTERVAL = float(os.environ.get("WATCHDOG_INTERVAL", "30"))
+# 浏览器内存超过该值（MB）时重启浏览器上下文，0 表示不限制
+BROWSER_MAX_RSS_MB = float(os.environ.get("BROWSER_MAX_RSS_MB", "2048"))
+# 重启前不阻塞新调用、等待进行中的调用陆续归还页面的最长时间（秒），超时则放弃本次重启
+RESTART_DRAIN_TIMEOUT = float(os.environ.get("RESTART_DRAIN_TIMEOUT", "120"))
+# 随后暂停借出页面、等待剩余调用结束的最长时间（秒），新调用最多因重启排队这么久
+RESTART_GATE_TIMEOUT = float(os.environ.get("RESTART_GATE_TIMEOUT", "10"))
+# 重启被推迟后，下次尝试前的等待时间从巡检间隔起逐次翻倍，最长为该值（秒）
+RESTART_BACKOFF_MAX = float(os.environ.get("RESTART_BACKOFF_MAX", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+def browser_rss_mb() -> Optional[float]:
+    """当前进程所有子进程（Playwright 驱动与浏览器）的 RSS 合计，未安装 psutil 时返回 None"""
+    if psutil is None:
+        return None
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024 / 1024
+
+
+class BrowserWatchdog:
+    """
+    定期采样浏览器内存：页面 JS 堆超过阈值的页面交由页面池回收，
+    浏览器整体内存超过 BROWSER_MAX_RSS_MB 时排空页面池并重启浏览器上下文。
+    """
+
+    def __init__(self, get_pool: Callable, restart: Callable[[], Awaitable[bool]],
+                 interval: float = WATCHDOG_INTERVAL, max_rss_mb: float = BROWSER_MAX_RSS_MB):
+        self.get_pool = get_pool
+        self.restart = restart
+        self.interval = interval
+        self.max_rss_mb = max_rss_mb
+        self.restarts = 0
+        self.skipped_restarts = 0
+        self.backoff = 0.0
+        self._retry_at = 0.0
+        self.last = {}
+        self._task = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.warning("[内存] 检查失败: %s", e)
+
+    async def check(self):
+        """采样一次内存，必要时重启浏览器上下文"""
+        pool = self.get_pool()
+        if pool is None:
+            return
+        heap_mb = await pool.sample_memory()
+        rss_mb = browser_rss_mb()
+        used_mb = rss_mb if rss_mb is not None else heap_mb
+        self.last = {
+            "sampled_at": time.time(),
+            "browser_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+            "js_heap_mb": round(heap_mb, 1),
+        }
+        if self.max_rss_mb <= 0 or used_mb <= self.max_rss_mb:
+            self.backoff = 0.0
+            return
+        # 上次重启被推迟，退避期内不再尝试，避免反复暂停页面池
+        if time.monotonic() < self._retry_at:
+            return
+
+        logger.warning("[内存] 浏览器占用 %.0fMB，超过上限 %.0fMB，排空页面池后重启", used_mb, self.max_rss_mb)
+        if await self.restart():
+            self.restarts += 1
+            self.backoff = 0.0
+            count("browser_restarts")
+            logger.info("[内存] 浏览器上下文已重启")
+        else:
+            self.skipped_restarts += 1
+            self.backoff = min(RESTART_BACKOFF_MAX, max(self.interval, self.backoff * 2))
+            self._retry_at = time.monotonic() + self.backoff
+            logger.warning("[内存] 正在交互登录或仍有调用未结束，推迟重启，%.0f 秒后再试", self.backoff)
+
+    def stats(self) -> Dict:
+        return {
+            **self.last,
+            "max_rss_mb": self.max_rss_mb,
+            "restarts": self.restarts,
+            "skipped_restarts": self.skipped_restarts,
+            "restart_backoff_s": self.backoff,
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        lines = [
+            "# TYPE imooc_browser_restarts_total counter",
+            f"imooc_browser_restarts_total {self.restarts}",
+        ]
+        if self.last.get("browser_rss_mb") is not None:
+            lines.append("# TYPE imooc_browser_rss_mb gauge")
+            lines.append(f"imooc_browser_rss_mb {self.last['browser_rss_mb']}")
+        pool = self.get_pool()
+        if pool is not None:
+            stats = pool.stats()
+            lines.extend([
+                "# TYPE imooc_page_js_heap_mb gauge",
+                f"imooc_page_js_heap_mb {stats['heap_mb']}",
+                "# TYPE imooc_pages_recycled_total counter",
+                f"imooc_pages_recycled_total {stats['recycled']}",
+                "# TYPE imooc_page_pool_in_use gauge",
+                f"imooc_page_pool_in_use {stats['in_use']}",
+            ])
+        return lines
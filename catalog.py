@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 课程记录中保存的字段，url 为主键
+COURSE_FIELDS = ("title", "description", "price", "teacher", "level", "duration", "students")
+# 抓取失败时填充的占位文本，不覆盖已有的真实值
+PLACEHOLDERS = {"未知标题", "无描述", "暂无描述"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    price TEXT NOT NULL DEFAULT '',
+    teacher TEXT NOT NULL DEFAULT '',
+    level TEXT NOT NULL DEFAULT '',
+    duration TEXT NOT NULL DEFAULT '',
+    students TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    content_hash TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    fetched_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_courses_fetched_at ON courses (fetched_at);
+"""
+
+# 全文索引列及其 bm25 权重（url 列不参与检索）
+FTS_COLUMNS = ("title", "description", "teacher", "level")
+FTS_WEIGHTS = (0.0, 10.0, 2.0, 5.0, 1.0)
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5("
+    f"url UNINDEXED, {', '.join(FTS_COLUMNS)}, tokenize='unicode61')"
+)
+
+_TOKEN_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+
+
+def _is_cjk(run: str) -> bool:
+    return ord(run[0]) >= 0x3400
+
+
+def tokenize(text: str) -> List[str]:
+    """中文按单字和相邻二字切分，英文数字按单词切分"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or "").lower()):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _match_query(query: str) -> str:
+    """将查询词转换为 FTS5 表达式：中文取相邻二字（单字时取单字），各词须同时命中"""
+    terms = []
+    for run in _TOKEN_RE.findall((query or "").lower()):
+        if _is_cjk(run) and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return " ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+def content_hash(record: Dict[str, str]) -> str:
+    """按课程字段计算内容哈希，用于判断记录是否变化"""
+    payload = json.dumps([record.get(name, "") for name in COURSE_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class CourseCatalog:
+    """本地课程目录：以课程 URL 为键保存所有抓取到的记录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # 工作进程模式下多个进程共用同一个目录库，写锁被占用时最多等待 30 秒
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        try:
+            self.conn.execute(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 时退化为 LIKE 查询
+            self.fts = False
+        self.conn.commit()
+        if self.fts and self._fts_count() != self.count():
+            self.rebuild_index()
+
+    def _fts_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM courses_fts").fetchone()[0]
+
+    def _index(self, url: str, record: Dict[str, str]):
+        if not self.fts:
+            return
+        self.conn.execute("DELETE FROM courses_fts WHERE url = ?", (url,))
+        self.conn.execute(
+            f"INSERT INTO courses_fts (url, {', '.join(FTS_COLUMNS)}) VALUES (?{', ?' * len(FTS_COLUMNS)})",
+            (url, *(" ".join(tokenize(record.get(name, ""))) for name in FTS_COLUMNS))
+        )
+
+    def rebuild_index(self):
+        """根据课程表重建全文索引"""
+        with self.conn:
+            self.conn.execute("DELETE FROM courses_fts")
+            for row in self.conn.execute("SELECT * FROM courses").fetchall():
+                self._index(row["url"], dict(row))
+
+    def upsert(self, records: Iterable[Dict[str, str]], source: str) -> Dict[str, int]:
+        """
+        合并写入课程记录。新记录缺少的字段保留原值；
+        内容哈希未变化的记录只更新抓取时间。
+        """
+        now = time.time()
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        with self.conn:
+            for record in records:
+                url = record.get("url")
+                if not url:
+                    continue
+                row = self.conn.execute("SELECT * FROM courses WHERE url = ?", (url,)).fetchone()
+                merged = {}
+                for name in COURSE_FIELDS:
+                    value = record.get(name) or ""
+                    if row is not None and (not value or value in PLACEHOLDERS):
+                        value = row[name] or value
+                    merged[name] = value
+                digest = content_hash(merged)
+
+                if row is None:
+                    self.conn.execute(
+                        f"INSERT INTO courses (url, {', '.join(COURSE_FIELDS)}, source, content_hash, "
+                        f"first_seen, fetched_at, updated_at) VALUES ({', '.join('?' * (len(COURSE_FIELDS) + 6))})",
+                        (url, *merged.values(), source, digest, now, now, now)
+                    )
+                    self._index(url, merged)
+                    counts["inserted"] += 1
+                elif row["content_hash"] == digest:
+                    self.conn.execute("UPDATE courses SET fetched_at = ? WHERE url = ?", (now, url))
+                    counts["unchanged"] += 1
+                else:
+                    self.conn.execute(
+                        f"UPDATE courses SET {', '.join(f'{name} = ?' for name in COURSE_FIELDS)}, "
+                        f"source = ?, content_hash = ?, fetched_at = ?, updated_at = ? WHERE url = ?",
+                        (*merged.values(), source, digest, now, now, url)
+                    )
+                    self._index(url, merged)
+                    counts["updated"] += 1
+        return counts
+
+    def get(self, url: str) -> Optional[Dict[str, str]]:
+        row = self.conn.execute("SELECT * FROM courses WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def stale_urls(self, max_age: float, limit: int) -> List[str]:
+        """返回抓取时间早于 max_age 秒之前的课程 URL，最旧的优先"""
+        cutoff = time.time() - max_age
+        rows = self.conn.execute(
+            "SELECT url FROM courses WHERE fetched_at < ? ORDER BY fetched_at LIMIT ?", (cutoff, limit)
+        ).fetchall()
+        return [row["url"] for row in rows]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """在本地目录中全文检索课程，按相关度排序"""
+        if self.fts:
+            expression = _match_query(query)
+            if not expression:
+                return []
+            rows = self.conn.execute(
+                f"SELECT c.*, bm25(courses_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS score "
+                f"FROM courses_fts JOIN courses c ON c.url = courses_fts.url "
+                f"WHERE courses_fts MATCH ? ORDER BY score LIMIT ?",
+                (expression, limit)
+            ).fetchall()
+        else:
+            pattern = f"%{query.strip()}%"
+            rows = self.conn.execute(
+                f"SELECT * FROM courses WHERE {' OR '.join(f'{name} LIKE ?' for name in FTS_COLUMNS)} LIMIT ?",
+                (*([pattern] * len(FTS_COLUMNS)), limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_courses(self, chunk_size: int = 500) -> Iterator[List[Dict[str, str]]]:
+        """按块遍历目录中的全部课程，避免一次性读入内存"""
+        cursor = self.conn.execute(f"SELECT url, {', '.join(COURSE_FIELDS)} FROM courses ORDER BY url")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import time
+from typing import AsyncIterator, Dict, List, Sequence
+
+import pandas as pd
+
+# Parquet 导出依赖 pyarrow，缺少时仅该格式不可用
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {"csv": "csv", "jsonl": "jsonl", "parquet": "parquet"}
+EXPORT_FIELDS = ("url", "title", "description", "price", "teacher", "level", "duration", "students")
+EXPORT_CHUNK_SIZE = 500
+
+
+class ChunkedWriter:
+    """按块写出记录，内存中最多缓存 chunk_size 条"""
+
+    def __init__(self, path: str, fmt: str, fields: Sequence[str] = EXPORT_FIELDS,
+                 chunk_size: int = EXPORT_CHUNK_SIZE):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt == "parquet" and pq is None:
+            raise ValueError("导出 Parquet 需要安装 pyarrow")
+        self.path = path
+        self.fmt = fmt
+        self.fields = list(fields)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self._buffer = []
+        self._file = None
+        self._csv = None
+        self._parquet = None
+        if fmt in ("csv", "jsonl"):
+            # utf-8-sig 便于 Excel 直接打开中文 CSV
+            self._file = open(path, "w", encoding="utf-8-sig" if fmt == "csv" else "utf-8", newline="")
+            if fmt == "csv":
+                self._csv = csv.DictWriter(self._file, fieldnames=self.fields, extrasaction="ignore")
+                self._csv.writeheader()
+
+    def write(self, records: List[Dict[str, str]]):
+        self._buffer.extend({name: record.get(name, "") for name in self.fields} for record in records)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.fmt == "csv":
+            self._csv.writerows(self._buffer)
+            self._file.flush()
+        elif self.fmt == "jsonl":
+            self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in self._buffer))
+            self._file.flush()
+        else:
+            table = pa.Table.from_pandas(pd.DataFrame(self._buffer, columns=self.fields), preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+        elif self.fmt == "parquet":
+            # 没有任何记录时也写出带表头的空文件
+            pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=self.fields), preserve_index=False), self.path)
+
+
+async def export_stream(batches: AsyncIterator[List[Dict[str, str]]], path: str, fmt: str) -> Dict:
+    """消费记录生成器并分块写入文件，返回行数与吞吐量"""
+    start = time.perf_counter()
+    writer = ChunkedWriter(path, fmt)
+    try:
+        async for batch in batches:
+            writer.write(batch)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "format": fmt,
+        "rows": writer.rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(writer.rows / elapsed, 1) if elapsed > 0 else 0.0,
+    }
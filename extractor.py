@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List
+
+from site_profile import PROFILE
+from selector_resolver import resolver
+from tracing import count, span, ROUNDTRIPS, SELECTOR_FALLBACKS
+
+BASE_URL = PROFILE.base_url
+
+# 抽取规则定义在 site_profile.py 中，这里保留原有名称供各模块引用
+SEARCH_CARD_SCHEMA = PROFILE.schemas["search_card"]
+COURSE_CARD_SCHEMA = PROFILE.schemas["course_card"]
+OPEN_COURSE_SCHEMA = PROFILE.schemas["open_course"]
+CONTENT_ITEM_SCHEMA = PROFILE.schemas["content_item"]
+COURSE_DETAIL_SCHEMA = PROFILE.schemas["course_detail"]
+
+# 在页面内一次性遍历所有卡片并按规则取值，只产生一次 IPC 往返
+_EXTRACT_JS = """
+({cards, fields, limit}) => {
+    const query = (root, selector) => {
+        try {
+            return root.querySelector(selector);
+        } catch (e) {
+            return null;
+        }
+    };
+    let nodes = [];
+    let cardIndex = -1;
+    for (const [index, selector] of cards.entries()) {
+        try {
+            nodes = Array.from(document.querySelectorAll(selector));
+        } catch (e) {
+            nodes = [];
+        }
+        if (nodes.length) {
+            cardIndex = index;
+            break;
+        }
+    }
+    // hits 统计每个字段各候选选择器的命中次数，供选择器解析器学习顺序
+    const hits = {};
+    for (const [name, spec] of Object.entries(fields)) hits[name] = spec.selectors.map(() => 0);
+    const records = nodes.slice(0, limit).map(card => {
+        const record = {};
+        for (const [name, spec] of Object.entries(fields)) {
+            let value = null;
+            for (const [index, selector] of spec.selectors.entries()) {
+                const el = query(card, selector);
+                if (!el) continue;
+                value = spec.attr ? el.getAttribute(spec.attr) : el.textContent;
+                if (value !== null) {
+                    hits[name][index]++;
+                    break;
+                }
+            }
+            record[name] = value === null ? "" : value.trim();
+        }
+        return record;
+    });
+    return {records, cardIndex, hits};
+}
+"""
+
+
+def absolute_url(href: str) -> str:
+    """将页面中的相对链接补全为完整地址"""
+    if not href:
+        return ""
+    if href.startswith('//'):
+        return f"https:{href}"
+    if href.startswith('/'):
+        return f"{BASE_URL}{href}"
+    if href.startswith('http'):
+        return href
+    return f"{BASE_URL}/{href}"
+
+
+async def extract_cards(page, schema: Dict, limit: int) -> List[Dict[str, str]]:
+    """按抽取规则一次性获取页面上的卡片数据"""
+    # 按上次命中的顺序尝试选择器
+    ordered = resolver.order_schema(schema)
+    with span("extract"):
+        count(ROUNDTRIPS)
+        result = await page.evaluate(_EXTRACT_JS, {
+            "cards": ordered["cards"],
+            "fields": ordered["fields"],
+            "limit": limit,
+        })
+    records = result["records"]
+    count(SELECTOR_FALLBACKS, resolver.record_schema(schema, ordered, result["cardIndex"], result["hits"], len(records)))
+    for record in records:
+        for name, spec in schema["fields"].items():
+            if spec.get("attr") == "href":
+                record[name] = absolute_url(record[name])
+    return records
+
+
+async def query_first(page, element: str):
+    """
+    按 site_profile 中该元素的候选选择器依次查找，返回第一个命中的元素，均未命中时返回 None。
+    上次命中的选择器优先尝试，减少无效的往返。
+    """
+    candidates = PROFILE.selectors(element)
+    scope = f"element.{element}"
+    for index, selector in enumerate(resolver.order(scope, candidates)):
+        count(ROUNDTRIPS)
+        try:
+            handle = await page.query_selector(selector)
+        except Exception:
+            handle = None
+        if handle is not None:
+            if index > 0:
+                count(SELECTOR_FALLBACKS)
+            resolver.record(scope, candidates, {selector: 1})
+            return handle
+    resolver.record(scope, candidates, {}, misses=1)
+    return None
+
+
+async def extract_one(page, schema: Dict) -> Dict[str, str]:
+    """按抽取规则获取页面上的单条记录，未匹配时各字段为空"""
+    records = await extract_cards(page, schema, 1)
+    if records:
+        return records[0]
+    return {name: "" for name in schema["fields"]}
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from extractor import absolute_url, BASE_URL
+from selector_resolver import resolver
+from tracing import count, span, SELECTOR_FALLBACKS
+
+# HTTP 直连抓取为可选功能，缺少依赖时自动回退到浏览器
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+HTTP_FAST_PATH = os.environ.get("HTTP_FAST_PATH", "1") != "0"
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "10"))
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _select(root, selector: str):
+    try:
+        return root.css(selector)
+    except Exception:
+        return []
+
+
+def _select_first(root, selector: str):
+    try:
+        return root.css_first(selector)
+    except Exception:
+        return None
+
+
+def extract_cards_html(html: str, schema: Dict, limit: int) -> List[Dict[str, str]]:
+    """在静态 HTML 上执行与 extract_cards 相同的抽取规则"""
+    tree = HTMLParser(html)
+    ordered = resolver.order_schema(schema)
+    nodes = []
+    card_index = -1
+    for index, selector in enumerate(ordered["cards"]):
+        nodes = [tree.root] if selector == ":root" else _select(tree, selector)
+        if nodes:
+            card_index = index
+            break
+
+    hits = {name: [0] * len(spec["selectors"]) for name, spec in ordered["fields"].items()}
+    records = []
+    for card in nodes[:limit]:
+        record = {}
+        for name, spec in ordered["fields"].items():
+            value = None
+            for index, selector in enumerate(spec["selectors"]):
+                el = _select_first(card, selector)
+                if el is None:
+                    continue
+                value = el.attributes.get(spec["attr"]) if spec.get("attr") else el.text(deep=True)
+                if value is not None:
+                    hits[name][index] += 1
+                    break
+            value = "" if value is None else value.strip()
+            if spec.get("attr") == "href":
+                value = absolute_url(value)
+            record[name] = value
+        records.append(record)
+    count(SELECTOR_FALLBACKS, resolver.record_schema(schema, ordered, card_index, hits, len(records)))
+    return records
+
+
+def has_required(records: List[Dict[str, str]], schema: Dict) -> bool:
+    """所有记录都包含规则中声明的必要字段时返回 True"""
+    required = schema.get("required", [])
+    return bool(records) and all(record.get(name) for record in records for name in required)
+
+
+class HttpFetcher:
+    """复用浏览器 Cookie 的异步 HTTP 客户端，用于抓取服务端渲染的页面"""
+
+    def __init__(self, cookie_file: str):
+        self.cookie_file = cookie_file
+        self._cookies = self._load_cookies()
+        self._client = None
+
+    @property
+    def available(self) -> bool:
+        return HTTP_FAST_PATH and httpx is not None and HTMLParser is not None
+
+    def _load_cookies(self) -> Dict[str, str]:
+        try:
+            with open(self.cookie_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    async def sync_cookies(self, context):
+        """从持久化浏览器上下文同步 Cookie，并保存供重启后使用"""
+        cookies = await context.cookies(BASE_URL)
+        self._cookies = {c["name"]: c["value"] for c in cookies}
+        if self._client is not None:
+            self._client.cookies.clear()
+            self._client.cookies.update(self._cookies)
+        try:
+            with open(self.cookie_file, "w", encoding="utf-8") as f:
+                json.dump(self._cookies, f)
+        except OSError as e:
+            logger.warning("保存 Cookie 失败: %s", e)
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT, "Referer": BASE_URL},
+                cookies=self._cookies,
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """获取页面 HTML，失败或非 HTML 响应时返回 None"""
+        if not self.available:
+            return None
+        try:
+            with span("http_fetch"):
+                response = await self._get_client().get(url)
+        except Exception as e:
+            logger.info("[HTTP] 请求失败 %s: %s", url, e)
+            return None
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+            return None
+        return response.text
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
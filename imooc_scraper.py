@@ -1,59 +1,112 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict
-from dataclasses import dataclass
-from urllib.parse import quote
-from playwright.async_api import async_playwright
 from fastmcp import FastMCP
+from browser import launch_context, HEADLESS
+from page_pool import PagePool
+from lazy_primitive import LazyPrimitive
+from resource_blocker import ResourceBlocker
+from readiness import Budget, goto_ready
+from extractor import extract_cards, query_first, COURSE_CARD_SCHEMA
+from site_profile import PROFILE
+from models import Course, format_courses, courses_json
+from tracing import setup_logging
 
-# 
+# 配置
 BROWSER_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_data")
 os.makedirs(BROWSER_DATA_DIR, exist_ok=True)
-
-# ʼ MCP 
-mcp = FastMCP("imooc_course_scraper")
-
-# 
-@dataclass
-class Course:
-    title: str
-    description: str
-    price: str
-    url: str
+# 诊断日志写到标准错误，--server 模式下标准输出是 MCP 协议通道
+logger = logging.getLogger(__name__)
 
 class ImoocScraper:
+    """
+    长期复用的抓取器：浏览器在首次使用时启动，并发调用共享同一个浏览器上下文，
+    浏览器崩溃或被关闭后下次调用时自动重新启动。
+    """
+
     def __init__(self):
+        self.playwright = None
         self.browser_context = None
         self.page = None
+        self.page_pool = None
         self.is_logged_in = False
+        self.resource_blocker = ResourceBlocker()
+        self._lock = LazyPrimitive()
+        self._login_lock = LazyPrimitive()
+        self._disconnected = False
+    
+    def _alive(self) -> bool:
+        return self.browser_context is not None and not self._disconnected and not self.page.is_closed()
+    
+    def _on_close(self, *_):
+        # 主动关闭时 browser_context 已置空，不视为断开
+        if self.browser_context is not None:
+            logger.warning("浏览器已断开，下次调用时将重新启动")
+            self._disconnected = True
     
     async def ensure_browser(self):
-        """ȷ"""
-        if not self.browser_context:
-            p = await async_playwright().start()
-            self.browser_context = await p.chromium.launch_persistent_context(
-                user_data_dir=BROWSER_DATA_DIR,
-                headless=False
-            )
+        """确保浏览器已启动；已断开时清理旧实例并重新启动。并发调用只会启动一次"""
+        if self._alive():
+            return
+        async with self._lock:
+            if self._alive():
+                return
+            if self.browser_context is not None:
+                await self._shutdown()
+            self.playwright, self.browser_context = await launch_context(BROWSER_DATA_DIR)
+            self._disconnected = False
+            self.browser_context.on("close", self._on_close)
+            await self.resource_blocker.install(self.browser_context)
             if self.browser_context.pages:
                 self.page = self.browser_context.pages[0]
             else:
                 self.page = await self.browser_context.new_page()
+            # 登录使用主页面，搜索从页面池借用页面，互不抢占
+            self.page_pool = PagePool(self.browser_context)
+    
+    async def _shutdown(self):
+        context, playwright = self.browser_context, self.playwright
+        self.browser_context = self.playwright = self.page = self.page_pool = None
+        self.is_logged_in = False
+        if context is not None:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception:
+                pass
+    
+    async def close(self):
+        """关闭浏览器并停止 Playwright"""
+        async with self._lock:
+            await self._shutdown()
     
     async def login(self) -> str:
-        """¼Ľ"""
+        """登录慕课网，并发调用时只有一个在操作登录页面"""
+        async with self._login_lock:
+            return await self._login()
+    
+    async def _login(self) -> str:
         await self.ensure_browser()
         
         if self.is_logged_in:
-            return "ѵ¼Ľ˺"
+            return "已登录慕课网账号"
         
-        await self.page.goto("https://www.imooc.com")
-        await asyncio.sleep(2)
+        self.resource_blocker.begin(self.page, "login")
+        await goto_ready(self.page, PROFILE.url("home"), "home", Budget("login"))
         
-        login_button = await self.page.query_selector('text="¼"')
+        login_button = await query_first(self.page, "login_button")
+        if login_button and HEADLESS:
+            # 无头模式下无法交互登录，不要占着登录锁空等
+            return "当前为无头模式，无法交互登录。请先在桌面环境运行 `python rsq.py login` 完成登录。"
         if login_button:
-            print("ɵ¼...")
+            logger.info("请在浏览器中完成登录操作...")
             await login_button.click()
             
             max_wait_time = 180
@@ -62,119 +115,130 @@ class ImoocScraper:
             
             while waited_time < max_wait_time:
                 await asyncio.sleep(wait_interval)
-                if not await self.page.query_selector('text="¼"'):
+                if not await query_first(self.page, "login_button"):
                     self.is_logged_in = True
-                    return "¼ɹ"
+                    return "登录成功！"
                 waited_time += wait_interval
             
-            return "¼ȴʱ"
+            return "登录等待超时，请重试"
         else:
             self.is_logged_in = True
-            return "ѵ¼Ľ˺"
+            return "已登录慕课网账号"
     
     async def search_courses(self, keywords: str, limit: int = 10) -> List[Course]:
-        """γ"""
+        """搜索课程，浏览器在执行中断开时重新启动并重试一次"""
+        try:
+            return await self._search_courses(keywords, limit)
+        except Exception as e:
+            if self._alive():
+                raise
+            logger.warning("浏览器异常（%s），重新启动后重试", e)
+            return await self._search_courses(keywords, limit)
+    
+    async def _search_courses(self, keywords: str, limit: int) -> List[Course]:
         await self.ensure_browser()
         
         if not self.is_logged_in:
             await self.login()
         
-        search_url = f"https://www.imooc.com/course/list?words={quote(keywords)}"
-        await self.page.goto(search_url)
-        await asyncio.sleep(3)
-        
         courses = []
-        try:
-            course_cards = await self.page.query_selector_all('.course-card')
-            
-            for card in course_cards[:limit]:
-                try:
-                    title_el = await card.query_selector('.course-card-name')
-                    title = await title_el.text_content() if title_el else "δ֪"
-                    
-                    desc_el = await card.query_selector('.course-card-desc')
-                    desc = await desc_el.text_content() if desc_el else ""
-                    
-                    price_el = await card.query_selector('.course-card-price')
-                    price = await price_el.text_content() if price_el else ""
-                    
-                    link_el = await card.query_selector('a')
-                    href = await link_el.get_attribute('href') if link_el else ""
-                    url = f"https://www.imooc.com{href}" if href else ""
-                    
-                    courses.append(Course(
-                        title=title.strip(),
-                        description=desc.strip(),
-                        price=price.strip(),
-                        url=url
-                    ))
-                except Exception as e:
-                    print(f"γʱ{str(e)}")
-                    continue
-        except Exception as e:
-            print(f"γʱ{str(e)}")
+        async with self.page_pool.page() as page:
+            self.resource_blocker.begin(page, "search_courses")
+            try:
+                search_url = PROFILE.url("course_search_list", keywords)
+                await goto_ready(page, search_url, "course_list", Budget("search_courses"))
+                cards = await extract_cards(page, COURSE_CARD_SCHEMA, limit)
+                for card in cards:
+                    courses.append(Course.from_record({
+                        **card,
+                        "title": card["title"] or "未知标题",
+                        "description": card["description"] or "无描述",
+                        "price": card["price"] or "免费",
+                    }))
+            except Exception as e:
+                if not self._alive():
+                    raise
+                logger.warning("搜索课程时出错：%s", e)
+            finally:
+                self.resource_blocker.end(page)
         
         return courses
 
-# MCP
+
+# 所有 MCP 调用共用的抓取器，服务退出时关闭浏览器
+scraper = ImoocScraper()
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """MCP 服务生命周期：退出时关闭共享的浏览器"""
+    try:
+        yield
+    finally:
+        await scraper.close()
+
+
+# 初始化 MCP 服务
+mcp = FastMCP("imooc_course_scraper", lifespan=lifespan)
+
+# MCP工具
 @mcp.tool()
 async def login() -> str:
-    """¼Ľ˺"""
-    scraper = ImoocScraper()
+    """登录慕课网账号"""
     return await scraper.login()
 
 @mcp.tool()
-async def search_courses(keywords: str, limit: int = 10) -> str:
-    """Ľγ"""
-    scraper = ImoocScraper()
+async def search_courses(keywords: str, limit: int = 10, format: str = "text") -> str:
+    """搜索慕课网课程，format 为 json 时返回结构化结果"""
     courses = await scraper.search_courses(keywords, limit)
     
+    if format == "json":
+        return courses_json(courses, keywords=keywords)
     if not courses:
-        return f"δҵ"{keywords}"صĿγ"
+        return f'未找到与"{keywords}"相关的课程'
     
-    output = f"ҵ {len(courses)} ؿγ̣\n\n"
-    for i, course in enumerate(courses, 1):
-        output += f"{i}. {course.title}\n"
-        output += f"   {course.description}\n"
-        output += f"   ۸{course.price}\n"
-        output += f"   ӣ{course.url}\n\n"
-    
-    return output
+    return format_courses(f"找到 {len(courses)} 个相关课程：", courses,
+                          [("描述", "description"), ("价格", "price"), ("链接", "url")], hide=(), sep="：")
 
-# ֱнűʱ
+# 直接运行脚本时的入口
 async def main():
-    """ֱнűʱ"""
-    scraper = ImoocScraper()
-    await scraper.login()
-    
+    """直接运行脚本时的主函数"""
+    try:
+        await scraper.login()
+        await _interactive_search()
+    finally:
+        await scraper.close()
+
+async def _interactive_search():
     while True:
         try:
-            keywords = input("\nҪĿγ̹ؼʣֱӻس˳").strip()
+            keywords = input("\n请输入要搜索的课程关键词（直接回车退出）：").strip()
             if not keywords:
                 break
             
             courses = await scraper.search_courses(keywords)
             if courses:
-                print(f"\nҵ {len(courses)} ؿγ̣\n")
+                print(f"\n找到 {len(courses)} 个相关课程：\n")
                 for i, course in enumerate(courses, 1):
                     print(f"{i}. {course.title}")
-                    print(f"   {course.description}")
-                    print(f"   ۸{course.price}")
-                    print(f"   ӣ{course.url}\n")
+                    print(f"   描述：{course.description}")
+                    print(f"   价格：{course.price}")
+                    print(f"   链接：{course.url}\n")
             else:
-                print(f"\nδҵ"{keywords}"صĿγ")
+                print(f'\n未找到与"{keywords}"相关的课程')
         except Exception as e:
-            print(f"{str(e)}")
+            print(f"发生错误：{str(e)}")
         
-        choice = input("\nǷ(y/n): ").strip().lower()
+        choice = input("\n是否继续搜索？(y/n): ").strip().lower()
         if choice != 'y':
             break
 
 if __name__ == "__main__":
     import sys
+    setup_logging()
     if len(sys.argv) > 1 and sys.argv[1] == "--server":
-        # Ϊ
+        # 作为服务器运行
         mcp.run()
     else:
-        # Ϊű
+        # 作为独立脚本运行
         asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+
+class LazyPrimitive:
+    """
+    首次使用时才创建的 asyncio 同步原语（锁、信号量等），用法与被包装的对象相同。
+    Python 3.9 下在导入时或事件循环启动前创建的原语会绑定到另一个事件循环，
+    模块级或随对象提前创建的原语统一用它包装，在运行中的事件循环内创建。
+    """
+
+    def __init__(self, factory=asyncio.Lock, *args):
+        self._factory = factory
+        self._args = args
+        self._value = None
+
+    def _get(self):
+        if self._value is None:
+            self._value = self._factory(*self._args)
+        return self._value
+
+    def locked(self) -> bool:
+        # 尚未创建时必然未被持有，无需为查询而创建
+        return self._value is not None and self._value.locked()
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    async def __aenter__(self):
+        return await self._get().__aenter__()
+
+    async def __aexit__(self, *exc_info):
+        return await self._get().__aexit__(*exc_info)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from site_profile import PROFILE
+
+# 慕课网登录会话 Cookie
+LOGIN_COOKIES = ("apsid",)
+LOGIN_COOKIE_URL = PROFILE.base_url
+# 登录状态判定结果的有效期（秒）
+LOGIN_STATE_TTL = int(os.environ.get("LOGIN_STATE_TTL", "1800"))
+STATE_FILE = "login_state.json"
+
+logger = logging.getLogger(__name__)
+
+
+class LoginState:
+    """基于 Cookie 的登录状态缓存，判定结果持久化到浏览器数据目录"""
+
+    def __init__(self, data_dir: str, ttl: int = LOGIN_STATE_TTL):
+        self.path = os.path.join(data_dir, STATE_FILE)
+        self.ttl = ttl
+        self.logged_in = None
+        self.checked_at = 0.0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.logged_in = state.get("logged_in")
+            self.checked_at = float(state.get("checked_at", 0))
+        except (OSError, ValueError):
+            pass
+
+    def save(self, logged_in: bool):
+        """记录判定结果并写入磁盘，重启后仍可使用"""
+        self.logged_in = logged_in
+        self.checked_at = time.time()
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"logged_in": logged_in, "checked_at": self.checked_at}, f)
+        except OSError as e:
+            logger.warning("保存登录状态失败: %s", e)
+
+    def cached(self) -> Optional[bool]:
+        """返回有效期内的判定结果，过期时返回 None"""
+        if self.logged_in is None or time.time() - self.checked_at > self.ttl:
+            return None
+        return self.logged_in
+
+    async def check_cookies(self, context) -> Optional[bool]:
+        """读取会话 Cookie 判断登录状态，无法判断时返回 None"""
+        cookies = await context.cookies(LOGIN_COOKIE_URL)
+        session = [c for c in cookies if c["name"] in LOGIN_COOKIES and c.get("value")]
+        if not session:
+            return None
+        now = time.time()
+        return any(c.get("expires", -1) in (-1, None) or c["expires"] > now for c in session)
+
+    async def check(self, context) -> Optional[bool]:
+        """
+        先查缓存再查 Cookie，均无法判断时返回 None，由调用方回退到页面检查。
+        缓存只直接信任“已登录”：未登录时可能已在其他进程（如 python rsq.py login）中完成登录，
+        需重新读取状态文件并检查 Cookie，Cookie 无法判断时才沿用缓存的未登录结果。
+        """
+        status = self.cached()
+        if status:
+            return status
+        if status is False:
+            self._load()
+            if self.cached():
+                return True
+        verdict = await self.check_cookies(context)
+        if verdict is not None:
+            self.save(verdict)
+            return verdict
+        return status
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+
+# 课程数据类，所有工具共用
+@dataclass
+class Course:
+    # 显式声明 __slots__ 以减少大批量记录的内存占用（兼容 Python 3.9，不使用 slots=True）
+    __slots__ = ("title", "description", "price", "url", "teacher", "level", "duration", "students")
+    title: str
+    description: str
+    price: str
+    url: str
+    teacher: str
+    level: str
+    duration: str
+    students: str
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Course":
+        """由抓取记录（字典）构造课程，缺失字段置为空字符串"""
+        return cls(*(str(record.get(f.name) or "") for f in fields(cls)))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def format_courses(header: str, courses: Iterable[Course], rows: Sequence[Tuple[str, str]],
+                   hide: Tuple[str, ...] = ("",), sep: str = ": ") -> str:
+    """
+    将课程渲染为编号列表文本，一次拼接完成。
+    rows 为 (标签, 字段名) 列表；字段值在 hide 中时不输出该行。
+    """
+    lines = [header, ""]
+    for idx, course in enumerate(courses, start=1):
+        lines.append(f"{idx}. {course.title}")
+        for label, name in rows:
+            value = getattr(course, name)
+            if value not in hide:
+                lines.append(f"   {label}{sep}{value}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def to_json(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, indent=2)
+
+
+def courses_json(courses: List[Course], **meta) -> str:
+    """将课程列表与附加信息渲染为 JSON"""
+    return to_json({**meta, "count": len(courses), "results": [course.to_dict() for course in courses]})
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+import os
+from contextlib import asynccontextmanager
+
+from tracing import count
+
+# 页面池大小，可通过环境变量调整
+PAGE_POOL_SIZE = int(os.environ.get("PAGE_POOL_SIZE", "4"))
+# 健康检查超时（秒）
+HEALTH_CHECK_TIMEOUT = 3
+# 页面导航次数或 JS 堆超过阈值后关闭重建，0 表示不限制
+PAGE_MAX_NAVIGATIONS = int(os.environ.get("PAGE_MAX_NAVIGATIONS", "200"))
+PAGE_MAX_HEAP_MB = float(os.environ.get("PAGE_MAX_HEAP_MB", "256"))
+# 切换浏览器上下文前，先在不暂停借出的情况下等待借出的页面降到该数量以内
+SWAP_QUIET_PAGES = 1
+
+# 当前调用已借出的页面数；已持有页面的调用在排空期间仍可借用，避免与排空互相等待
+_held = contextvars.ContextVar("page_pool_held", default=0)
+
+
+class PagePool:
+    """
+    共享浏览器上下文上的有界页面池，每个工具调用独占一个页面。
+    记录每个页面的导航次数与 JS 堆占用，超过阈值的页面归还时关闭，下次借用时新建。
+    """
+
+    def __init__(self, context, size: int = PAGE_POOL_SIZE, page_timeout: int = 60000):
+        self.context = context
+        self.size = max(1, size)
+        self.page_timeout = page_timeout
+        self._idle = []
+        self._in_use = set()
+        self._slots = asyncio.Semaphore(self.size)
+        self._navigations = {}
+        self._heap = {}
+        self._retired = set()
+        self._recycled = 0
+        # 排空期间清除，新调用在此等待
+        self._open = asyncio.Event()
+        self._open.set()
+        self._released = asyncio.Event()
+
+    async def _is_healthy(self, page) -> bool:
+        """检查页面是否仍可用"""
+        if page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(page.evaluate("1"), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _new_page(self):
+        page = await self.context.new_page()
+        page.set_default_timeout(self.page_timeout)
+        self._navigations[page] = 0
+        page.on("framenavigated", lambda frame: self._on_navigated(page, frame))
+        return page
+
+    def _on_navigated(self, page, frame):
+        if frame.parent_frame is None and page in self._navigations:
+            self._navigations[page] += 1
+
+    def _forget(self, page):
+        self._navigations.pop(page, None)
+        self._heap.pop(page, None)
+        self._retired.discard(page)
+
+    async def _discard(self, page):
+        self._forget(page)
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+    def _should_recycle(self, page) -> bool:
+        if page in self._retired:
+            return True
+        return 0 < PAGE_MAX_NAVIGATIONS <= self._navigations.get(page, 0)
+
+    async def acquire(self):
+        """取出一个健康的页面，池满或正在排空时等待"""
+        if not _held.get():
+            await self._open.wait()
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                page = self._idle.pop()
+                if await self._is_healthy(page):
+                    break
+                await self._discard(page)
+            else:
+                page = await self._new_page()
+        except Exception:
+            self._slots.release()
+            raise
+        self._in_use.add(page)
+        _held.set(_held.get() + 1)
+        return page
+
+    async def try_acquire(self):
+        """池中有空位时取出页面，否则立即返回 None，不等待"""
+        if self._slots.locked() or (not self._open.is_set() and not _held.get()):
+            return None
+        return await self.acquire()
+
+    async def release(self, page):
+        """归还页面，已损坏或达到回收阈值的页面直接关闭"""
+        self._in_use.discard(page)
+        _held.set(max(0, _held.get() - 1))
+        try:
+            if page.is_closed():
+                self._forget(page)
+            elif self._should_recycle(page):
+                self._recycled += 1
+                count("pages_recycled")
+                await self._discard(page)
+            elif len(self._idle) < self.size:
+                self._idle.append(page)
+            else:
+                await self._discard(page)
+        finally:
+            self._slots.release()
+            self._released.set()
+
+    async def sample_memory(self) -> float:
+        """采样各页面的 JS 堆占用（MB），超过 PAGE_MAX_HEAP_MB 的页面标记为待回收，返回合计"""
+        pages = self._idle + list(self._in_use)
+        heaps = await asyncio.gather(*(self._page_heap(page) for page in pages))
+        for page, heap in zip(pages, heaps):
+            if heap is None:
+                continue
+            self._heap[page] = heap
+            if PAGE_MAX_HEAP_MB > 0 and heap > PAGE_MAX_HEAP_MB * 1024 * 1024:
+                self._retired.add(page)
+        # 空闲页面无需等待归还，直接关闭
+        for page in [page for page in self._idle if page in self._retired]:
+            self._idle.remove(page)
+            self._recycled += 1
+            count("pages_recycled")
+            await self._discard(page)
+        return sum(self._heap.values()) / 1024 / 1024
+
+    async def _page_heap(self, page):
+        if page.is_closed():
+            return None
+        try:
+            return await asyncio.wait_for(
+                page.evaluate("performance.memory ? performance.memory.usedJSHeapSize : 0"), HEALTH_CHECK_TIMEOUT)
+        except Exception:
+            return None
+
+    async def swap_context(self, relaunch, timeout: float, gate_timeout: float) -> bool:
+        """
+        等待所有借出的页面归还后调用 relaunch() 换用新的浏览器上下文。
+        先不阻塞新调用，等待借出的页面降到 SWAP_QUIET_PAGES 个以内（最长 timeout 秒）；
+        再暂停借出，等待其余页面归还（最长 gate_timeout 秒），暂停期间新调用排队，已持有页面的调用不受影响。
+        任一阶段超时或 relaunch() 返回 None（保留当前上下文）时放弃本次切换，返回 False。
+        """
+        try:
+            await asyncio.wait_for(self._wait_in_use(SWAP_QUIET_PAGES), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._open.clear()
+        try:
+            try:
+                await asyncio.wait_for(self._wait_in_use(0), gate_timeout)
+            except asyncio.TimeoutError:
+                return False
+            idle, self._idle = self._idle, []
+            for page in idle:
+                await self._discard(page)
+            context = await relaunch()
+            if context is None:
+                return False
+            self.context = context
+            return True
+        finally:
+            self._open.set()
+
+    async def _wait_in_use(self, limit: int):
+        while len(self._in_use) > limit:
+            self._released.clear()
+            await self._released.wait()
+
+    @asynccontextmanager
+    async def page(self):
+        """以上下文管理器方式借用页面"""
+        page = await self.acquire()
+        try:
+            yield page
+        finally:
+            await self.release(page)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "draining": not self._open.is_set(),
+            "recycled": self._recycled,
+            "max_navigations": max(self._navigations.values(), default=0),
+            "heap_mb": round(sum(self._heap.values()) / 1024 / 1024, 1),
+        }
+
+    async def close(self):
+        """关闭池中所有页面"""
+        pages = self._idle + list(self._in_use)
+        self._idle = []
+        self._in_use = set()
+        self._released.set()
+        for page in pages:
+            await self._discard(page)
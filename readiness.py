@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from site_profile import PROFILE
+from tracing import count, record, span, ROUNDTRIPS
+
+# 各页面类型的就绪条件，定义见 site_profile.py
+READY_SPECS = PROFILE.pages
+
+# 每个工具一次调用的总等待预算（毫秒）
+TOOL_BUDGETS = {
+    "login": 20000,
+    "search_courses": 30000,
+    "get_course_details": 20000,
+    "search_courses_by_teacher": 20000,
+    "favorite_course": 20000,
+    "search_contents": 20000,
+    "recommend_courses": 20000,
+}
+DEFAULT_BUDGET = 20000
+MIN_WAIT_MS = 1000
+
+# 等待结果：出现卡片或命中接口、显示“无结果”提示、超时
+READY = "ready"
+EMPTY = "empty"
+TIMEOUT = "timeout"
+
+logger = logging.getLogger(__name__)
+
+
+class Budget:
+    """单次工具调用的等待时间预算"""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.deadline = time.monotonic() + TOOL_BUDGETS.get(tool, DEFAULT_BUDGET) / 1000
+
+    def remaining(self) -> int:
+        """剩余可用的等待时间（毫秒），至少保留 MIN_WAIT_MS"""
+        return max(MIN_WAIT_MS, int((self.deadline - time.monotonic()) * 1000))
+
+
+_STATUS_TEXT = {READY: "就绪", EMPTY: "无结果", TIMEOUT: "超时"}
+
+
+def _record(page_type: str, tool: str, elapsed_ms: float, status: str):
+    # 按页面类型记入追踪阶段 ready.<页面类型>，就绪、无结果、超时分别计数
+    record(f"ready.{page_type}", elapsed_ms, status)
+    logger.debug("[等待] %s / %s: %s，用时 %.0fms", tool, page_type, _STATUS_TEXT[status], elapsed_ms)
+
+
+def _response_waiter(page, patterns: List[str], timeout: int) -> Optional[asyncio.Future]:
+    if not patterns:
+        return None
+    return asyncio.ensure_future(page.wait_for_response(
+        lambda response: any(p in response.url for p in patterns),
+        timeout=timeout
+    ))
+
+
+async def _wait_for(page, spec: Dict, timeout: int, response_task=None) -> str:
+    """等待就绪条件或“无结果”提示，返回 READY、EMPTY 或 TIMEOUT"""
+    statuses = {asyncio.ensure_future(page.wait_for_selector(
+        spec["selector"], state="attached", timeout=timeout
+    )): READY}
+    if spec.get("empty"):
+        # 提示元素可能预先存在于模板中，只在显示时才算无结果
+        statuses[asyncio.ensure_future(page.wait_for_selector(
+            spec["empty"], state="visible", timeout=timeout
+        ))] = EMPTY
+    if response_task is not None:
+        statuses[response_task] = READY
+    count(ROUNDTRIPS, len(statuses))
+
+    pending = set(statuses)
+    status = TIMEOUT
+    try:
+        # 任一条件满足即返回，条件失败（超时）时继续等待其余条件
+        while pending and status == TIMEOUT:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [statuses[task] for task in done if not task.exception()]
+            if succeeded:
+                status = READY if READY in succeeded else EMPTY
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            try:
+                await task
+            except BaseException:
+                pass
+    return status
+
+
+async def wait_ready(page, page_type: str, budget: Budget) -> str:
+    """等待当前页面达到指定页面类型的就绪条件，返回 READY、EMPTY 或 TIMEOUT"""
+    start = time.perf_counter()
+    with span("wait"):
+        status = await _wait_for(page, READY_SPECS[page_type], budget.remaining())
+    _record(page_type, budget.tool, (time.perf_counter() - start) * 1000, status)
+    return status
+
+
+async def goto_ready(page, url: str, page_type: str, budget: Budget, responses: Optional[List[str]] = None) -> str:
+    """
+    打开页面并等待就绪，替代固定时长的 sleep；返回 READY、EMPTY 或 TIMEOUT。
+    responses 为额外的接口 URL 片段，命中任一响应即视为就绪，供直接解析接口数据、无需等卡片渲染的调用方使用
+    """
+    spec = READY_SPECS[page_type]
+    start = time.perf_counter()
+    response_task = _response_waiter(page, spec["responses"] + list(responses or []), budget.remaining())
+    try:
+        with span("navigate"):
+            count(ROUNDTRIPS)
+            await page.goto(url, wait_until="domcontentloaded", timeout=budget.remaining())
+    except Exception:
+        if response_task is not None:
+            response_task.cancel()
+        raise
+    with span("wait"):
+        status = await _wait_for(page, spec, budget.remaining(), response_task)
+    _record(page_type, budget.tool, (time.perf_counter() - start) * 1000, status)
+    return status
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+def _env_list(name: str, default: str) -> Set[str]:
+    value = os.environ.get(name, default)
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+# 是否启用资源拦截
+BLOCK_RESOURCES = os.environ.get("BLOCK_RESOURCES", "1") != "0"
+# 默认拦截的资源类型与第三方统计域名
+DEFAULT_DENY_TYPES = _env_list("BLOCK_RESOURCE_TYPES", "image,font,media")
+DEFAULT_DENY_DOMAINS = _env_list(
+    "BLOCK_DOMAINS",
+    "hm.baidu.com,cnzz.com,google-analytics.com,googletagmanager.com,"
+    "doubleclick.net,growingio.com,sensorsdata.cn"
+)
+DEFAULT_ALLOW_DOMAINS = _env_list("ALLOW_DOMAINS", "")
+
+# 被拦截请求的估算体积（字节），用于统计节省的流量
+ESTIMATED_SIZES = {
+    "image": 30 * 1024,
+    "font": 60 * 1024,
+    "media": 500 * 1024,
+    "script": 20 * 1024,
+    "stylesheet": 15 * 1024,
+}
+DEFAULT_ESTIMATED_SIZE = 2 * 1024
+
+
+def _match_domain(host: str, domains: Set[str]) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+@dataclass
+class BlockPolicy:
+    """资源拦截策略：先看域名黑白名单，再看资源类型"""
+    deny_types: Set[str] = field(default_factory=lambda: set(DEFAULT_DENY_TYPES))
+    deny_domains: Set[str] = field(default_factory=lambda: set(DEFAULT_DENY_DOMAINS))
+    allow_domains: Set[str] = field(default_factory=lambda: set(DEFAULT_ALLOW_DOMAINS))
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        host = urlparse(url).hostname or ""
+        if _match_domain(host, self.deny_domains):
+            return True
+        if _match_domain(host, self.allow_domains):
+            return False
+        return resource_type in self.deny_types
+
+
+# 按工具覆盖默认策略：登录需要加载二维码等图片
+TOOL_POLICIES = {
+    "login": BlockPolicy(deny_types=set()),
+}
+
+
+class ResourceBlocker:
+    """通过 context.route 拦截无用资源，并按页面统计拦截结果"""
+
+    def __init__(self, default_policy: Optional[BlockPolicy] = None,
+                 tool_policies: Optional[Dict[str, BlockPolicy]] = None):
+        self.default_policy = default_policy or BlockPolicy()
+        self.tool_policies = TOOL_POLICIES if tool_policies is None else tool_policies
+        self._page_tools = {}
+        self._page_stats = {}
+
+    async def install(self, context):
+        """在持久化上下文上注册路由规则"""
+        if BLOCK_RESOURCES:
+            await context.route("**/*", self._handle)
+
+    def _page_of(self, request):
+        try:
+            return request.frame.page
+        except Exception:
+            # Service Worker 等请求没有所属页面
+            return None
+
+    async def _handle(self, route):
+        request = route.request
+        page = self._page_of(request)
+        tool = self._page_tools.get(page)
+        policy = self.tool_policies.get(tool, self.default_policy)
+
+        if policy.blocks(request.resource_type, request.url):
+            stats = self._page_stats.get(page)
+            if stats is not None:
+                stats["requests"] += 1
+                stats["bytes"] += ESTIMATED_SIZES.get(request.resource_type, DEFAULT_ESTIMATED_SIZE)
+            await route.abort()
+        else:
+            await route.fallback()
+
+    def begin(self, page, tool: str):
+        """标记页面正在为某个工具服务，并重置统计"""
+        self._page_tools[page] = tool
+        self._page_stats[page] = {"requests": 0, "bytes": 0}
+
+    def end(self, page) -> Dict[str, int]:
+        """结束统计并返回本次调用节省的请求数与估算字节数"""
+        tool = self._page_tools.pop(page, None)
+        stats = self._page_stats.pop(page, {"requests": 0, "bytes": 0})
+        if tool and stats["requests"]:
+            logger.debug("[拦截] %s: 拦截 %d 个请求，约节省 %.0fKB", tool, stats["requests"], stats["bytes"] / 1024)
+        return stats
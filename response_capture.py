@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from extractor import absolute_url
+from site_profile import PROFILE
+from tracing import count, span
+
+# 页面就绪后等待已发出的接口请求返回的最长时间（秒），以及读取响应体的超时
+CAPTURE_WAIT_TIMEOUT = float(os.environ.get("CAPTURE_WAIT_TIMEOUT", "2"))
+CAPTURE_BODY_TIMEOUT = 5
+
+
+def _get_path(data: Any, path: str) -> Any:
+    """按点分路径取值，列表下标用数字表示，如 data.list 或 data.0.name"""
+    for part in path.split("."):
+        if isinstance(data, dict):
+            data = data.get(part)
+        elif isinstance(data, list) and part.isdigit() and int(part) < len(data):
+            data = data[int(part)]
+        else:
+            return None
+    return data
+
+
+def parse_payload(payload: Any, spec: Dict) -> List[Dict[str, str]]:
+    """将接口返回的 JSON 按 items/fields 映射转换为课程记录，无法识别时返回空列表"""
+    items = None
+    for path in spec["items"]:
+        candidate = _get_path(payload, path) if path else payload
+        if isinstance(candidate, list) and candidate and isinstance(candidate[0], dict):
+            items = candidate
+            break
+    if items is None:
+        return []
+
+    records = []
+    for item in items:
+        record = {}
+        for field, keys in spec["fields"].items():
+            value = next((v for v in (_get_path(item, key) for key in keys) if v not in (None, "")), "")
+            record[field] = str(value).strip()
+        course_id = record.pop("id", "")
+        if not record.get("url") and course_id:
+            record["url"] = PROFILE.url("course_detail", course_id)
+        record["url"] = absolute_url(record.get("url", ""))
+        records.append(record)
+    return records
+
+
+class ResponseCapture:
+    """
+    在页面上监听发往站点数据接口的请求。每次导航前调用 reset()，
+    页面就绪后调用 records() 取出解析后的课程记录。
+    patterns 可作为 goto_ready 的 responses 参数，接口响应先于卡片返回时提前就绪；
+    由卡片先触发就绪时接口响应可能尚未返回，records() 会在短时间内等待已发出的请求。
+    """
+
+    def __init__(self, page, spec: Dict):
+        self.page = page
+        self.spec = spec
+        self._requests = []
+        page.on("request", self._on_request)
+
+    @property
+    def patterns(self) -> List[str]:
+        return self.spec["responses"]
+
+    def _on_request(self, request):
+        if any(pattern in request.url for pattern in self.spec["responses"]):
+            self._requests.append(request)
+
+    def reset(self):
+        self._requests = []
+
+    async def _read(self, request) -> Optional[Any]:
+        try:
+            response = await asyncio.wait_for(request.response(), CAPTURE_WAIT_TIMEOUT)
+            if response is None or "json" not in (response.headers.get("content-type") or ""):
+                return None
+            return await asyncio.wait_for(response.json(), CAPTURE_BODY_TIMEOUT)
+        except Exception:
+            return None
+
+    async def records(self) -> List[Dict[str, str]]:
+        """返回接口响应中解析出的记录；没有发出接口请求或响应无法解析时返回空列表"""
+        if not self._requests:
+            count("capture_misses")
+            return []
+        with span("capture"):
+            payloads = await asyncio.gather(*(self._read(request) for request in self._requests))
+        records = []
+        for payload in payloads:
+            if payload is not None:
+                records.extend(parse_payload(payload, self.spec))
+        count("capture_hits" if records else "capture_misses")
+        return records
+
+    def close(self):
+        try:
+            self.page.remove_listener("request", self._on_request)
+        except Exception:
+            pass
+
+
+def capture_for(page, page_type: str) -> Optional[ResponseCapture]:
+    """页面类型在站点配置中声明了数据接口时返回监听器，否则返回 None（RESPONSE_CAPTURE=0 时不声明）"""
+    spec = PROFILE.captures.get(page_type)
+    if spec is None:
+        return None
+    return ResponseCapture(page, spec)
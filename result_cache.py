@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urldefrag
+
+from single_flight import SingleFlight
+
+# 各工具结果的新鲜期（秒）
+CACHE_TTLS = {
+    "search_courses": 600,
+    "get_course_details": 3600,
+    "search_courses_by_teacher": 1800,
+}
+DEFAULT_TTL = 600
+# 过期后仍可先返回旧结果、同时在后台刷新的时长（秒）
+STALE_TTL = int(os.environ.get("RESULT_CACHE_STALE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_SIZE", "512"))
+# 设置 RESULT_CACHE_DISK=1 后缓存同时写入磁盘，重启后仍可命中
+CACHE_ON_DISK = os.environ.get("RESULT_CACHE_DISK", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_arg(value):
+    """规范化单个参数：压缩空白，URL 去掉锚点和末尾斜杠"""
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        if value.startswith("http"):
+            value = urldefrag(value)[0].rstrip("/")
+    return value
+
+
+def make_key(tool: str, args: Dict[str, Any]) -> str:
+    """由工具名和规范化后的参数生成缓存键"""
+    normalized = {name: normalize_arg(value) for name, value in args.items()}
+    return json.dumps({"tool": tool, "args": normalized}, ensure_ascii=False, sort_keys=True)
+
+
+class ResultCache:
+    """
+    按工具设置有效期的 LRU 结果缓存，支持过期后后台刷新与磁盘持久化。
+    未命中时相同参数的并发调用合并为一次抓取。
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttls: Optional[Dict[str, int]] = None,
+                 stale_ttl: int = STALE_TTL, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.stale_ttl = stale_ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.flights = SingleFlight()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, value: Any):
+        entry = {"stored_at": time.time(), "value": value}
+        self._remember(key, entry)
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+            except (OSError, TypeError) as e:
+                logger.warning("写入缓存失败: %s", e)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        try:
+            self.put(key, await fetch())
+        except Exception as e:
+            logger.warning("[缓存] 后台刷新失败: %s", e)
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(self, tool: str, args: Dict[str, Any], fetch: Callable[[], Awaitable[Any]],
+                           timeout: Optional[float] = None) -> Any:
+        """
+        命中缓存直接返回；过期不久则返回旧值并后台刷新；否则调用 fetch 获取并缓存。
+        timeout 只限制当前调用方的等待时间，不会中断其他调用方共享的抓取。
+        """
+        start = time.perf_counter()
+        key = make_key(tool, args)
+        entry = self._load(key)
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            ttl = self.ttls.get(tool, DEFAULT_TTL)
+            if age < ttl:
+                logger.debug("[缓存] 命中 %s，用时 %.1fms", tool, (time.perf_counter() - start) * 1000)
+                return entry["value"]
+            if age < ttl + self.stale_ttl:
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+                logger.debug("[缓存] 返回过期结果 %s，后台刷新中", tool)
+                return entry["value"]
+            self.invalidate(key)
+
+        async def fetch_and_store():
+            value = await fetch()
+            self.put(key, value)
+            return value
+
+        return await self.flights.do(key, fetch_and_store, timeout)
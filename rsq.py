@@ -1,89 +1,358 @@
 # -*- coding: utf-8 -*-
-from typing import Any, List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Optional
 import asyncio
+from contextlib import asynccontextmanager
+import functools
+import inspect
 import json
+import logging
 import os
-import pandas as pd
+import sys
+import time
 from datetime import datetime
-from playwright.async_api import async_playwright
-from fastmcp import FastMCP
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from fastmcp import FastMCP, Context
+from browser import launch_context, HEADLESS, EAGER_BROWSER
+from page_pool import PagePool
+from lazy_primitive import LazyPrimitive
+from browser_watchdog import BrowserWatchdog, RESTART_DRAIN_TIMEOUT, RESTART_GATE_TIMEOUT
+from worker_pool import WorkerPool, WORKERS, serve_worker
+from resource_blocker import ResourceBlocker
+from login_state import LoginState
+from result_cache import ResultCache, CACHE_ON_DISK, normalize_arg, make_key
+from http_fetch import HttpFetcher, extract_cards_html, has_required
+from catalog import CourseCatalog
+from exporter import export_stream, EXPORT_FORMATS, EXPORT_CHUNK_SIZE
+from readiness import Budget, goto_ready, wait_ready, EMPTY, TIMEOUT
+from tracing import (
+    traced, mark_error, call_failed, trace_stats, prometheus_text, start_metrics_server, register_metrics, setup_logging
+)
+from site_profile import PROFILE
+from selector_resolver import resolver as selector_resolver
+from models import Course, format_courses, courses_json, to_json
+from response_capture import capture_for
+from extractor import (
+    extract_cards, extract_one, query_first, SEARCH_CARD_SCHEMA, COURSE_CARD_SCHEMA, OPEN_COURSE_SCHEMA, COURSE_DETAIL_SCHEMA,
+    CONTENT_ITEM_SCHEMA
+)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """MCP 服务生命周期：按需在后台预热浏览器，启动指标服务与内存巡检"""
+    # 工作进程模式下前端不抓取，也不打开浏览器：各工作进程自行预热，且复制配置时源目录不能正被写入
+    local_browser = not worker_pool.enabled
+    warm_up = asyncio.create_task(_warm_up()) if EAGER_BROWSER and local_browser else None
+    metrics_server = await start_metrics_server()
+    if local_browser:
+        watchdog.start()
+    try:
+        yield
+    finally:
+        if warm_up is not None and not warm_up.done():
+            warm_up.cancel()
+        await watchdog.stop()
+        await worker_pool.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        selector_resolver.save()
+        await http_fetcher.close()
+
 
 # 初始化 MCP 服务
-mcp = FastMCP("imooc_course_scraper")
+mcp = FastMCP("imooc_course_scraper", lifespan=lifespan)
 
 # 全局变量
-BROWSER_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_data")
-DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BROWSER_DATA_DIR = os.environ.get(
+    "BROWSER_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_data"))
+DATA_DIR = os.environ.get("IMOOC_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
 TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
+# 分页抓取时最多翻到的页数，以及每页最多解析的卡片数
+MAX_RESULT_PAGES = int(os.environ.get("MAX_RESULT_PAGES", "10"))
+PAGE_SCAN_LIMIT = 200
+# 批量获取课程详情的默认并发数
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+# 内容类型对应的路由（见 site_profile.py），以及 all 模式下单个类型的截止时间（秒）
+CONTENT_ROUTES = {
+    "comment": "comment_list",
+    "column": "column_list",
+    "tutorial": "tutorial_list",
+    "note": "note_list"
+}
+CONTENT_DEADLINE = float(os.environ.get("CONTENT_DEADLINE", "15"))
+# 推荐课程分类对应的路由
+RECOMMEND_ROUTES = {
+    "free": "recommend_free",
+    "real": "recommend_real",
+    "system": "recommend_system"
+}
+# 导出时允许翻到的最大页数
+EXPORT_MAX_PAGES = int(os.environ.get("EXPORT_MAX_PAGES", "100"))
+# 工作进程模式下各进程的浏览器配置副本所在目录
+WORKER_PROFILE_ROOT = os.environ.get("WORKER_PROFILE_ROOT", BROWSER_DATA_DIR.rstrip("/\\") + "_workers")
 
 os.makedirs(BROWSER_DATA_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# 诊断日志写到标准错误，标准输出留给 MCP 协议与命令行结果
+logger = logging.getLogger(__name__)
+
 # 浏览器上下文共享
+playwright = None
 browser_context = None
 main_page = None
+page_pool = None
 is_logged_in = False
+_browser_lock = LazyPrimitive()
+# 交互登录期间持有，浏览器内存重启不会关闭正在登录的主页标签页
+_login_lock = LazyPrimitive()
+resource_blocker = ResourceBlocker()
+login_state = LoginState(BROWSER_DATA_DIR)
+http_fetcher = HttpFetcher(os.path.join(BROWSER_DATA_DIR, "http_cookies.json"))
+catalog = CourseCatalog(os.path.join(DATA_DIR, "catalog.db"))
+result_cache = ResultCache(disk_dir=os.path.join(DATA_DIR, "cache") if CACHE_ON_DISK else None)
+# 选择器命中顺序持久化，重启后仍优先尝试上次命中的选择器
+selector_resolver.attach(os.path.join(DATA_DIR, "selector_order.json"))
+# 浏览器内存巡检：回收占用过高的页面，必要时重启浏览器上下文
+watchdog = BrowserWatchdog(lambda: page_pool, lambda: restart_browser())
+register_metrics(watchdog.prometheus_lines)
+# 设置 WORKERS=N 时抓取类工具分派给 N 个工作进程执行，各自使用登录配置的副本
+worker_pool = WorkerPool(WORKERS, [sys.executable, os.path.abspath(__file__), "worker"],
+                         BROWSER_DATA_DIR, WORKER_PROFILE_ROOT)
+register_metrics(worker_pool.prometheus_lines)
+
+
+class ScrapeError(Exception):
+    """抓取失败，异常信息直接返回给 MCP 客户端"""
+
+
+def _reply_error(message: str, format: str) -> str:
+    """按输出格式返回错误信息，JSON 模式下包装为 {"error": ...}；同时计入工具的错误次数"""
+    mark_error()
+    return to_json({"error": message}) if format == "json" else message
+
+
+# 可分派给工作进程的工具：名称 → 未包装的实现，工作进程据此执行收到的调用
+_worker_tools = {}
+
+
+class _FailedResult(Exception):
+    """工作进程返回的错误信息：不写入缓存，原样返回给调用方"""
+
+
+def dispatched(func):
+    """
+    工作进程模式下把工具调用转发给负载最低的工作进程，相同参数的并发调用只转发一次。
+    未启用工作进程时原样返回，直接在当前进程执行。
+    """
+    _worker_tools[func.__name__] = func
+    if not worker_pool.enabled:
+        return func
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        # 进度上报上下文无法跨进程传递
+        arguments = {name: value for name, value in bound.arguments.items() if name != "ctx"}
+        timeout = arguments.get("timeout")
+        cache_args = {name: value for name, value in arguments.items() if name != "timeout"}
+        tool = func.__name__
+
+        async def call_worker():
+            reply = await worker_pool.call(tool, arguments)
+            if reply["failed"]:
+                raise _FailedResult(reply["value"])
+            return reply["value"]
+
+        try:
+            if tool in result_cache.ttls:
+                # 先查前端的结果缓存，命中时无需占用工作进程
+                return await result_cache.get_or_fetch(tool, cache_args, call_worker, timeout)
+            return await result_cache.flights.do(make_key(tool, cache_args), call_worker, timeout)
+        except _FailedResult as e:
+            mark_error()
+            return e.args[0]
+        except Exception as e:
+            return _reply_error(f"工作进程调用失败: {str(e)}", arguments.get("format", "text"))
+    return wrapper
+
+
+def _worker_entry(tool: str, func):
+    """工作进程内执行工具，并告知前端结果是否为错误信息，前端据此决定是否缓存"""
+    @traced(tool)
+    async def run(**arguments):
+        value = await func(**arguments)
+        return {"value": value, "failed": call_failed()}
+    return run
+
+
+async def _launch_browser():
+    """启动浏览器上下文并创建登录用的主页标签页，调用方需持有 _browser_lock"""
+    global playwright, browser_context, main_page
+
+    playwright, browser_context = await launch_context(
+        BROWSER_DATA_DIR,
+        viewport={"width": 1280, "height": 800},
+        timeout=60000
+    )
+    # 拦截图片、字体、媒体和第三方统计请求
+    await resource_blocker.install(browser_context)
+    # HTTP 直连抓取复用浏览器的登录 Cookie
+    await http_fetcher.sync_cookies(browser_context)
+    # 创建主页标签页（仅用于登录）
+    if browser_context.pages:
+        main_page = browser_context.pages[0]
+    else:
+        main_page = await browser_context.new_page()
+
+    main_page.set_default_timeout(60000)
+    resource_blocker.begin(main_page, "login")
+
+
+async def _close_browser():
+    """关闭浏览器上下文与 Playwright，调用方需持有 _browser_lock"""
+    global playwright, browser_context, main_page
+
+    if main_page is not None:
+        resource_blocker.end(main_page)
+    try:
+        if browser_context is not None:
+            await browser_context.close()
+        if playwright is not None:
+            await playwright.stop()
+    except Exception as e:
+        logger.warning("[内存] 关闭浏览器出错: %s", e)
+    playwright, browser_context, main_page = None, None, None
 
 
 async def ensure_browser():
     """确保浏览器已启动并登录"""
-    global browser_context, main_page, is_logged_in
-
-    if browser_context is None:
-        pw = await async_playwright().start()
-        browser_context = await pw.chromium.launch_persistent_context(
-            user_data_dir=BROWSER_DATA_DIR,
-            headless=False,
-            viewport={"width": 1280, "height": 800},
-            timeout=60000
-        )
-        # 创建主页标签页
-        if browser_context.pages:
-            main_page = browser_context.pages[0]
-        else:
-            main_page = await browser_context.new_page()
+    global page_pool
 
-        main_page.set_default_timeout(60000)
+    async with _browser_lock:
+        if browser_context is None:
+            await _launch_browser()
+            # 工具调用使用页面池，互不抢占同一标签页；重启失败后重新启动时沿用原页面池
+            if page_pool is None:
+                page_pool = PagePool(browser_context)
+            else:
+                page_pool.context = browser_context
 
-    if not is_logged_in:
-        await main_page.goto("https://www.imooc.com", timeout=60000)
-        await main_page.wait_for_load_state("networkidle")
-        await asyncio.sleep(2)
-        
-        # 检查是否存在用户头像或用户信息元素
-        user_info = await main_page.query_selector('.user-card-box')
-        if user_info:
-            is_logged_in = True
-            return True
+        return await _check_login()
+
+
+async def restart_browser() -> bool:
+    """
+    重启浏览器上下文以释放内存。先排空页面池：进行中的调用照常完成，新调用只在最后
+    RESTART_GATE_TIMEOUT 秒内排队等待新上下文；未能排空或正在交互登录时放弃本次重启。
+    """
+    if page_pool is None or _login_lock.locked():
         return False
-    return True
+
+    async def relaunch():
+        # 排空期间可能开始了登录，此时保留当前上下文
+        if _login_lock.locked():
+            return None
+        async with _login_lock, _browser_lock:
+            await _close_browser()
+            await _launch_browser()
+            return browser_context
+
+    return await page_pool.swap_context(relaunch, RESTART_DRAIN_TIMEOUT, RESTART_GATE_TIMEOUT)
+
+
+async def _warm_up():
+    """后台启动浏览器并检查登录状态"""
+    start = time.perf_counter()
+    try:
+        await ensure_browser()
+        logger.info("[启动] 浏览器预热完成，用时 %.0fms", (time.perf_counter() - start) * 1000)
+    except Exception as e:
+        logger.warning("[启动] 浏览器预热失败: %s", e)
+
+
+@asynccontextmanager
+async def tool_page(tool: str):
+    """从页面池借用页面，并按工具应用资源拦截策略"""
+    async with page_pool.page() as page:
+        resource_blocker.begin(page, tool)
+        try:
+            yield page
+        finally:
+            resource_blocker.end(page)
+
+
+def _record_courses(records: List[Dict[str, str]], source: str):
+    """将抓取到的课程写入本地目录，写入失败不影响工具返回"""
+    try:
+        counts = catalog.upsert(records, source)
+        logger.debug("[目录] 新增 %d，更新 %d，未变化 %d", counts["inserted"], counts["updated"], counts["unchanged"])
+    except Exception as e:
+        logger.warning("[目录] 写入失败: %s", e)
+
+
+async def _require_login():
+    """需要登录的工具调用前检查登录状态，缓存有效时无需启动浏览器"""
+    if login_state.cached():
+        return
+    login_status = await ensure_browser()
+    if not login_status:
+        raise ScrapeError("请先登录慕课网账号")
+
+
+async def _check_login():
+    """检查登录状态：优先使用缓存和会话 Cookie，无法判断时才加载主页"""
+    global is_logged_in
+
+    status = await login_state.check(browser_context)
+    if status is None:
+        await goto_ready(main_page, PROFILE.url("home"), "home", Budget("login"))
+
+        # 检查是否存在用户头像或用户信息元素
+        user_info = await query_first(main_page, "user_info")
+        status = user_info is not None
+        login_state.save(status)
+
+    is_logged_in = status
+    return status
 
 
 @mcp.tool()
+@traced("login")
 async def login() -> str:
     """登录慕课网账号"""
+    async with _login_lock:
+        return await _login()
+
+
+async def _login() -> str:
     global is_logged_in
     await ensure_browser()
 
     if is_logged_in:
         return "已登录慕课网账号"
 
-    await main_page.goto("https://www.imooc.com", timeout=60000)
-    await main_page.wait_for_load_state("networkidle")
-    await asyncio.sleep(2)
+    await goto_ready(main_page, PROFILE.url("home"), "home", Budget("login"))
 
     # 检查是否需要登录
-    user_info = await main_page.query_selector('.user-card-box')
+    user_info = await query_first(main_page, "user_info")
     if user_info:
         is_logged_in = True
+        login_state.save(True)
+        await http_fetcher.sync_cookies(browser_context)
         return "已登录慕课网账号"
 
+    if HEADLESS:
+        return "当前为无头模式，无法交互登录。请先在桌面环境运行 `python rsq.py login` 完成登录。"
+
     # 点击登录按钮
-    login_btn = await main_page.query_selector('.js-login-btn')
+    login_btn = await query_first(main_page, "login_button")
     if login_btn:
         await login_btn.click()
         message = "请在打开的浏览器中完成登录操作。登录成功后系统将继续运行。"
-        print(message)
+        logger.info(message)
         max_wait_time = 180
         wait_interval = 5
         waited_time = 0
@@ -91,10 +360,11 @@ async def login() -> str:
         while waited_time < max_wait_time:
             try:
                 await main_page.wait_for_load_state("networkidle", timeout=5000)
-                user_info = await main_page.query_selector('.user-card-box')
+                user_info = await query_first(main_page, "user_info")
                 if user_info:
                     is_logged_in = True
-                    await asyncio.sleep(2)
+                    login_state.save(True)
+                    await http_fetcher.sync_cookies(browser_context)
                     return "登录成功。"
             except Exception:
                 pass
@@ -106,247 +376,489 @@ async def login() -> str:
         return "未找到登录按钮，请检查网页状态。"
 
 
-@mcp.tool()
-async def search_courses(keywords: str, limit: int = 5) -> str:
-    """根据关键词搜索慕课网课程"""
-    login_status = await ensure_browser()
-    if not login_status:
-        return "请先登录慕课网账号"
+def with_page_number(url: str, page_no: int) -> str:
+    """为列表页地址设置页码参数"""
+    if page_no <= 1:
+        return url
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "page"]
+    query.append(("page", str(page_no)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _clean_course(card: Dict[str, str]) -> Dict[str, str]:
+    card["title"] = card["title"] or "未知标题"
+    return card
+
+
+def _display_courses(records: List[Dict[str, str]]) -> List[Course]:
+    """转换为输出用的课程对象；列表页未显示价格的课程按免费展示，该默认值不写入课程目录"""
+    return [Course.from_record({**record, "price": record.get("price") or "免费"}) for record in records]
+
+
+def _take_new_courses(cards: List[Dict[str, str]], seen: set, remaining: int) -> List[Dict[str, str]]:
+    """按 URL 去重，最多取 remaining 条之前未出现过的课程"""
+    batch = []
+    for card in cards:
+        if len(batch) >= remaining:
+            break
+        if not card["url"] or card["url"] in seen:
+            continue
+        seen.add(card["url"])
+        batch.append(_clean_course(card))
+    return batch
+
+
+async def _extract_page(page, tool: str, page_type: str, schema: Dict, capture) -> List[Dict[str, str]]:
+    """
+    优先使用页面数据接口返回的 JSON；未捕获到数据或记录缺少必要字段（如接口中没有 url 和 id）时回退到 DOM 抽取。
+    页面可能由接口响应提前就绪，回退前先等待卡片渲染。
+    """
+    if capture is not None:
+        records = await capture.records()
+        if has_required(records, schema):
+            return records
+        await wait_ready(page, page_type, Budget(tool))
+    return await extract_cards(page, schema, PAGE_SCAN_LIMIT)
 
+
+async def iter_courses(tool: str, url: str, page_type: str, schema: Dict, limit: int,
+                       max_pages: int = MAX_RESULT_PAGES, fallback=None) -> AsyncIterator[List[Dict[str, str]]]:
+    """
+    逐页抓取课程列表的异步生成器，每解析完一页即产出该页新课程。
+    达到 limit 后立即停止；当前页不足 limit 且池中有空闲页面时，在产出本页的同时预取下一页，
+    预取用的备用页面只在需要时借用，不再预取时立即归还。
+    页面类型配置了数据接口时优先解析接口 JSON（接口响应返回即视为就绪），未配置或接口数据不完整时从 DOM 抽取。
+    fallback(page, budget) 用于首页加载失败时的备用导航方式，返回结果页的等待结果；
+    使用备用方式后按页面当前地址翻页。
+    """
+    seen = set()
+    produced = 0
+    next_task = None
+    captures = {}
+
+    async def borrow(wait: bool):
+        page = await page_pool.acquire() if wait else await page_pool.try_acquire()
+        if page is not None:
+            resource_blocker.begin(page, tool)
+            captures[page] = capture_for(page, page_type)
+        return page
+
+    async def give_back(page):
+        capture = captures.pop(page)
+        if capture is not None:
+            capture.close()
+        resource_blocker.end(page)
+        await page_pool.release(page)
+
+    def open_page(page, target: str, budget: Budget):
+        # 解析接口数据时，接口响应先于卡片返回即可开始抽取
+        capture = captures[page]
+        if capture is not None:
+            capture.reset()
+        return goto_ready(page, target, page_type, budget, capture.patterns if capture is not None else None)
+
+    current = await borrow(wait=True)
+    spare = None
     try:
-        # 先进入主页
-        print("正在访问主页...")
-        await main_page.goto("https://www.imooc.com", timeout=60000)
-        await main_page.wait_for_load_state("networkidle")
-        await asyncio.sleep(2)
-
-        # 尝试多种方式找到搜索框
-        print("正在查找搜索框...")
-        search_selectors = [
-            '#js-search-input',
-            '.search-input',
-            'input[type="search"]',
-            'input[placeholder*="搜索"]',
-            'input[class*="search"]',
-            'input[id*="search"]'
-        ]
-        
-        search_input = None
-        for selector in search_selectors:
-            print(f"尝试选择器: {selector}")
-            search_input = await main_page.query_selector(selector)
-            if search_input:
-                print(f"找到搜索框，使用选择器: {selector}")
+        budget = Budget(tool)
+        try:
+            status = await open_page(current, url, budget)
+        except Exception as e:
+            if fallback is None:
+                raise
+            logger.warning("打开列表页失败: %s", e)
+            status = TIMEOUT
+        if status == TIMEOUT and fallback is not None:
+            status = await fallback(current, budget)
+            # 直接访问的地址已超时，后续页改从备用方式打开的结果页地址翻页
+            url = current.url
+        # 首页始终未就绪（验证码、登录墙或页面结构变化）时报错，而不是把空列表当作结果缓存
+        if status == TIMEOUT:
+            raise ScrapeError("列表页加载超时，未找到课程卡片")
+
+        page_no = 1
+        # 页面显示“无结果”时无需抽取
+        while status != EMPTY:
+            has_next = page_no < max_pages
+            next_url = with_page_number(url, page_no + 1)
+
+            cards = await _extract_page(current, tool, page_type, schema, captures[current])
+            batch = _take_new_courses(cards, seen, limit - produced)
+
+            # 没有新课程说明已越过最后一页
+            if not batch:
+                break
+            produced += len(batch)
+            logger.debug("第 %d 页解析完成，累计 %d 门课程", page_no, produced)
+            # 本页不足 limit 时才预取下一页，调用方处理本页结果的同时加载
+            if produced < limit and has_next:
+                if spare is None:
+                    spare = await borrow(wait=False)
+                if spare is not None:
+                    next_task = asyncio.create_task(open_page(spare, next_url, Budget(tool)))
+            elif spare is not None:
+                # 不再翻页，调用方处理本页结果期间不占用备用页面
+                await give_back(spare)
+                spare = None
+            yield batch
+
+            if produced >= limit or not has_next:
                 break
-                
-        if not search_input:
-            return "未找到搜索框，请检查网页结构"
-
-        print(f"正在输入搜索关键词: {keywords}")
-        await search_input.fill(keywords)
-        
-        # 尝试多种方式触发搜索
-        print("正在尝试触发搜索...")
-        search_btn = await main_page.query_selector('.search-btn')
-        if search_btn:
-            print("找到搜索按钮，点击搜索")
-            await search_btn.click()
-        else:
-            print("未找到搜索按钮，使用回车键搜索")
-            await search_input.press('Enter')
-            
-        await main_page.wait_for_load_state("networkidle")
-        await asyncio.sleep(3)
-
-        # 等待搜索结果页面加载完成
-        print("正在等待搜索结果加载...")
-        await main_page.wait_for_selector('.search-container', timeout=10000)
-        
-        # 切换到课程标签页
-        course_tab = await main_page.query_selector('.search-nav-item >> text=课程')
-        if course_tab:
-            await course_tab.click()
-            await main_page.wait_for_load_state("networkidle")
-            await asyncio.sleep(2)
-
-        # 获取课程列表
-        course_cards = await main_page.query_selector_all('.search-related-card')
-        if not course_cards:
-            print("尝试其他选择器...")
-            course_cards = await main_page.query_selector_all('.course-item')
-        
-        if not course_cards:
-            return f'未找到与"{keywords}"相关的课程'
 
-        print(f"找到 {len(course_cards)} 个课程")
-        results = []
-        for card in course_cards[:limit]:
             try:
-                # 标题
-                title_el = await card.query_selector('.search-related-card-title')
-                if not title_el:
-                    title_el = await card.query_selector('.search-related-card-name')
-                if not title_el:
-                    title_el = await card.query_selector('h3, h4')
-                title = await title_el.text_content() if title_el else "未知标题"
-
-                # 链接
-                link_el = await card.query_selector('a')
-                href = await link_el.get_attribute('href') if link_el else ""
-                if href:
-                    if href.startswith('//'):
-                        url = f"https:{href}"
-                    elif href.startswith('/'):
-                        url = f"https://www.imooc.com{href}"
-                    elif href.startswith('http'):
-                        url = href
-                    else:
-                        url = f"https://www.imooc.com/{href}"
+                if next_task is not None:
+                    status = await next_task
+                    next_task = None
+                    current, spare = spare, current
                 else:
-                    url = ""
-
-                # 描述
-                desc_el = await card.query_selector('.search-related-card-desc')
-                if not desc_el:
-                    desc_el = await card.query_selector('.course-desc')
-                desc = await desc_el.text_content() if desc_el else ""
-
-                # 价格
-                price_el = await card.query_selector('.search-related-card-price')
-                if not price_el:
-                    price_el = await card.query_selector('.price')
-                price = await price_el.text_content() if price_el else "免费"
-
-                # 只添加有效的课程信息
-                if title != "未知标题" and url:
-                    results.append({
-                        "title": title.strip(),
-                        "url": url,
-                        "description": desc.strip(),
-                        "price": price.strip()
-                    })
+                    status = await open_page(current, next_url, Budget(tool))
             except Exception as e:
-                print(f"处理课程卡片时出错: {str(e)}")
-                continue
-
-        if not results:
-            return f'未找到与"{keywords}"相关的有效课程信息'
-
-        output = "搜索结果：\n\n"
-        for idx, course in enumerate(results, start=1):
-            output += f"{idx}. {course['title']}\n"
-            if course['description']:
-                output += f"   描述: {course['description']}\n"
-            output += f"   链接: {course['url']}\n"
-            if course['price'] != "免费":
-                output += f"   价格: {course['price']}\n"
-            output += "\n"
+                logger.warning("加载第 %d 页失败: %s", page_no + 1, e)
+                break
+            page_no += 1
+    finally:
+        if next_task is not None and not next_task.done():
+            next_task.cancel()
+            try:
+                await next_task
+            except BaseException:
+                pass
+        for page in (current, spare):
+            if page is not None:
+                await give_back(page)
 
-        return output
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return f"搜索课程时出错: {str(e)}"
+async def iter_courses_fast(tool: str, url: str, page_type: str, schema: Dict, limit: int,
+                            max_pages: int = MAX_RESULT_PAGES) -> AsyncIterator[List[Dict[str, str]]]:
+    """
+    优先通过 HTTP 直接抓取服务端渲染的列表页，不经过浏览器渲染。
+    首页缺少必要字段（或 HTTP 不可用）时回退到浏览器分页抓取。
+    """
+    if http_fetcher.available:
+        seen = set()
+        produced = 0
+        next_html = asyncio.create_task(http_fetcher.fetch(url))
+        try:
+            for page_no in range(1, max_pages + 1):
+                html = await next_html
+                next_html = None
+                cards = extract_cards_html(html, schema, PAGE_SCAN_LIMIT) if html else []
+                if page_no == 1 and not has_required(cards, schema):
+                    logger.info("[HTTP] %s 页面缺少必要字段，改用浏览器抓取", tool)
+                    break
+                batch = _take_new_courses(cards, seen, limit - produced)
+                if not batch:
+                    break
+                produced += len(batch)
+                logger.debug("[HTTP] 第 %d 页解析完成，累计 %d 门课程", page_no, produced)
+                # 本页不足 limit 时才预取下一页，调用方处理本页结果的同时下载
+                if produced < limit and page_no < max_pages:
+                    next_html = asyncio.create_task(http_fetcher.fetch(with_page_number(url, page_no + 1)))
+                yield batch
+                if next_html is None:
+                    break
+        finally:
+            if next_html is not None:
+                next_html.cancel()
+        if produced:
+            return
 
+    await ensure_browser()
+    async for batch in iter_courses(tool, url, page_type, schema, limit, max_pages):
+        yield batch
 
-@mcp.tool()
-async def get_course_details(url: str) -> str:
-    """获取指定课程的详细信息"""
-    login_status = await ensure_browser()
-    if not login_status:
-        return "请先登录慕课网账号"
 
+async def _report_progress(ctx, produced: int, limit: int, batch: List[Dict[str, str]]):
+    """向 MCP 客户端推送进度与本页结果，客户端不支持时忽略"""
+    if ctx is None:
+        return
     try:
-        await main_page.goto(url, timeout=60000)
-        await asyncio.sleep(5)
+        await ctx.report_progress(produced, limit)
+        await ctx.info("\n".join(f"- {course['title']}: {course['url']}" for course in batch))
+    except Exception:
+        pass
 
-        title_el = await main_page.query_selector('h2.course-title')
-        title = await title_el.text_content() if title_el else "未知标题"
 
-        desc_el = await main_page.query_selector('.course-description')
-        description = await desc_el.text_content() if desc_el else ""
+async def collect_courses(courses: AsyncIterator[List[Dict[str, str]]], limit: int, ctx=None) -> List[Dict[str, str]]:
+    """消费分页生成器，边解析边推送部分结果"""
+    results = []
+    async for batch in courses:
+        results.extend(batch)
+        await _report_progress(ctx, len(results), limit, batch)
+    return results[:limit]
+
+
+async def _search_via_form(page, keywords: str, budget: Budget):
+    """通过主页搜索框搜索，仅在直接访问结果页失败时使用；返回结果页的等待结果"""
+    # 先进入主页
+    logger.debug("正在访问主页...")
+    await goto_ready(page, PROFILE.url("home"), "home", budget)
+
+    # 按候选选择器依次查找搜索框
+    logger.debug("正在查找搜索框...")
+    search_input = await query_first(page, "search_input")
+    if not search_input:
+        raise ScrapeError("未找到搜索框，请检查网页结构")
+
+    logger.debug("正在输入搜索关键词: %s", keywords)
+    await search_input.fill(keywords)
+
+    # 尝试多种方式触发搜索
+    logger.debug("正在尝试触发搜索...")
+    search_btn = await query_first(page, "search_button")
+    if search_btn:
+        logger.debug("找到搜索按钮，点击搜索")
+        await search_btn.click()
+    else:
+        logger.debug("未找到搜索按钮，使用回车键搜索")
+        await search_input.press('Enter')
 
-        teacher_el = await main_page.query_selector('.teacher-name')
-        teacher = await teacher_el.text_content() if teacher_el else ""
+    # 等待搜索结果页面加载完成
+    logger.debug("正在等待搜索结果加载...")
+    status = await wait_ready(page, "search", budget)
 
-        level_el = await main_page.query_selector('.course-infos-item:eq(1)')
-        level = await level_el.text_content() if level_el else ""
+    # 切换到课程标签页
+    course_tab = await query_first(page, "course_tab")
+    if course_tab:
+        await course_tab.click()
+        await page.wait_for_load_state("domcontentloaded")
+        status = await wait_ready(page, "search", budget)
+    return status
 
-        duration_el = await main_page.query_selector('.course-infos-item:eq(2)')
-        duration = await duration_el.text_content() if duration_el else ""
 
-        students_el = await main_page.query_selector('.target-user')
-        students = await students_el.text_content() if students_el else ""
+async def _scrape_search_courses(keywords: str, limit: int, ctx: Optional[Context] = None) -> List[Dict[str, str]]:
+    """在浏览器中搜索课程，按需翻页，返回课程记录列表"""
+    login_status = await ensure_browser()
+    if not login_status:
+        raise ScrapeError("请先登录慕课网账号")
 
-        result = {
-            "title": title.strip(),
-            "description": description.strip(),
-            "teacher": teacher.strip(),
-            "level": level.strip(),
-            "duration": duration.strip(),
-            "students": students.strip(),
-            "url": url
-        }
+    # 直接打开课程标签页的搜索结果，一次导航完成搜索；失败时改用主页搜索框
+    courses = iter_courses(
+        "search_courses", PROFILE.url("search_course", keywords), "search", SEARCH_CARD_SCHEMA, limit,
+        fallback=lambda page, budget: _search_via_form(page, keywords, budget)
+    )
+    results = await collect_courses(courses, limit, ctx)
+    _record_courses(results, "search_courses")
+    return results
 
-        return json.dumps(result, ensure_ascii=False, indent=2)
 
+@mcp.tool()
+@traced("search_courses")
+@dispatched
+async def search_courses(keywords: str, limit: int = 5, local_first: bool = False, format: str = "text",
+                         timeout: Optional[float] = None, ctx: Context = None) -> str:
+    """
+    根据关键词搜索慕课网课程
+    local_first 为 True 时先查本地课程目录，本地结果足够时不再访问网站
+    format 为 json 时返回结构化结果，默认 text
+    timeout 为本次调用最多等待的秒数；相同参数的并发调用共享同一次抓取
+    """
+    try:
+        local_results = catalog.search(keywords, limit) if local_first else []
+        if local_first and len(local_results) >= limit:
+            logger.debug("[目录] 本地命中 %d 门课程，跳过在线搜索", len(local_results))
+            results = local_results
+        else:
+            results = await result_cache.get_or_fetch(
+                "search_courses", {"keywords": keywords, "limit": limit},
+                lambda: _scrape_search_courses(keywords, limit, ctx), timeout
+            )
+    except ScrapeError as e:
+        return _reply_error(str(e), format)
     except Exception as e:
-        return f"获取课程详情失败: {str(e)}"
+        logger.exception("搜索课程时出错")
+        return _reply_error(f"搜索课程时出错: {str(e)}", format)
+
+    courses = _display_courses(results)
+    if format == "json":
+        return courses_json(courses, keywords=keywords)
+    if not courses:
+        return f'未找到与"{keywords}"相关的课程'
+
+    return format_courses("搜索结果：", courses, [("描述", "description"), ("链接", "url"), ("价格", "price")],
+                          hide=("", "免费"))
+
+
+async def _scrape_course_details(url: str) -> Dict[str, str]:
+    """获取课程详情：优先 HTTP 直连，缺少必要字段时在浏览器中打开课程页"""
+    await _require_login()
+
+    result = None
+    html = await http_fetcher.fetch(url)
+    if html:
+        records = extract_cards_html(html, COURSE_DETAIL_SCHEMA, 1)
+        if has_required(records, COURSE_DETAIL_SCHEMA):
+            result = records[0]
+
+    if result is None:
+        await ensure_browser()
+        async with tool_page("get_course_details") as page:
+            status = await goto_ready(page, url, "course_detail", Budget("get_course_details"))
+            if status == TIMEOUT:
+                raise ScrapeError(f"课程页面加载超时: {url}")
+            # 一次往返取回全部字段
+            result = await extract_one(page, COURSE_DETAIL_SCHEMA)
+        # 验证码、登录墙或页面结构变化时字段为空，不能当作课程详情缓存和写入目录
+        if not has_required([result], COURSE_DETAIL_SCHEMA):
+            raise ScrapeError(f"未能解析课程详情: {url}")
+
+    result["url"] = url
+    _record_courses([result], "get_course_details")
+    return result
 
 
 @mcp.tool()
-async def search_courses_by_teacher(teacher_name: str, limit: int = 5) -> str:
-    """根据教师名称搜索课程"""
-    login_status = await ensure_browser()
-    if not login_status:
-        return "请先登录慕课网账号"
+@traced("search_local_courses")
+async def search_local_courses(query: str, limit: int = 10, format: str = "text") -> str:
+    """在本地课程目录中离线全文检索课程（标题、描述、讲师、难度），不访问网站"""
+    start = time.perf_counter()
+    try:
+        results = catalog.search(query, limit)
+    except Exception as e:
+        return _reply_error(f"本地检索出错: {str(e)}", format)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    courses = [Course.from_record(record) for record in results]
+    if format == "json":
+        return courses_json(courses, query=query, elapsed_ms=round(elapsed, 1))
+    if not courses:
+        return f'本地目录（共 {catalog.count()} 门课程）中未找到与"{query}"相关的课程'
 
+    return format_courses(f"本地检索结果（{elapsed:.1f}ms）：", courses,
+                          [("描述", "description"), ("讲师", "teacher"), ("链接", "url")])
+
+
+@mcp.tool()
+@traced("get_course_details")
+@dispatched
+async def get_course_details(url: str, format: str = "json", timeout: Optional[float] = None) -> str:
+    """
+    获取指定课程的详细信息，format 为 text 时返回可读文本，默认 json
+    timeout 为本次调用最多等待的秒数；同一课程的并发请求共享同一次抓取
+    """
     try:
-        search_url = f"https://www.imooc.com/course/list?teacher={teacher_name}"
-        await main_page.goto(search_url, timeout=60000)
-        await asyncio.sleep(5)
+        result = await result_cache.get_or_fetch(
+            "get_course_details", {"url": url},
+            lambda: _scrape_course_details(url), timeout
+        )
+    except ScrapeError as e:
+        return _reply_error(str(e), format)
+    except Exception as e:
+        return _reply_error(f"获取课程详情失败: {str(e)}", format)
+
+    course = Course.from_record(result)
+    if format == "text":
+        return format_courses("课程详情：", [course], [
+            ("描述", "description"), ("讲师", "teacher"), ("难度", "level"),
+            ("时长", "duration"), ("学习人数", "students"), ("链接", "url")
+        ])
+    return to_json(course.to_dict())
+
 
-        course_cards = await main_page.query_selector_all('.course-card')
-        if not course_cards:
-            return f'未找到"{teacher_name}"的课程。'
+@mcp.tool()
+@traced("get_course_details_batch")
+@dispatched
+async def get_course_details_batch(urls: List[str], concurrency: int = BATCH_CONCURRENCY) -> str:
+    """
+    批量获取多个课程的详细信息，多个页面并发抓取。
+    重复的 URL 只抓取一次，返回每个 URL 的结果或错误信息（JSON）。
+    """
+    start = time.perf_counter()
+    unique_urls = list(dict.fromkeys(normalize_arg(url) for url in urls if url and url.strip()))
+    # 实际并发同时受页面池大小限制
+    semaphore = asyncio.Semaphore(max(1, concurrency))
 
-        results = []
-        for card in course_cards[:limit]:
-            title_el = await card.query_selector('.course-card-name')
-            title = await title_el.text_content() if title_el else "未知标题"
+    async def fetch_one(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                detail = await result_cache.get_or_fetch(
+                    "get_course_details", {"url": url},
+                    lambda: _scrape_course_details(url)
+                )
+                return {"url": url, "ok": True, "data": detail}
+            except Exception as e:
+                return {"url": url, "ok": False, "error": str(e)}
+
+    results = await asyncio.gather(*(fetch_one(url) for url in unique_urls))
+    succeeded = sum(1 for item in results if item["ok"])
+    payload = {
+        "total": len(unique_urls),
+        "succeeded": succeeded,
+        "failed": len(unique_urls) - succeeded,
+        "duplicates_removed": len(urls) - len(unique_urls),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000),
+        "results": results,
+    }
+    return json.dumps(payload, ensure_ascii=False, indent=2)
 
-            link_el = await card.query_selector('a')
-            href = await link_el.get_attribute('href') if link_el else ""
-            url = f"https://www.imooc.com{href}" if href else ""
 
-            desc_el = await card.query_selector('.course-desc')
-            desc = await desc_el.text_content() if desc_el else ""
+@mcp.tool()
+@traced("refresh_catalog")
+@dispatched
+async def refresh_catalog(max_age_hours: float = 24, limit: int = 20) -> str:
+    """重新抓取本地课程目录中超过 max_age_hours 未更新的课程详情"""
+    stale_urls = catalog.stale_urls(max_age_hours * 3600, limit)
+    if not stale_urls:
+        return f"本地目录共 {catalog.count()} 门课程，均在 {max_age_hours} 小时内更新过"
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def refresh_one(url: str) -> bool:
+        async with semaphore:
+            try:
+                detail = await _scrape_course_details(url)
+                result_cache.put(make_key("get_course_details", {"url": url}), detail)
+                return True
+            except Exception as e:
+                logger.warning("刷新课程失败 %s: %s", url, e)
+                return False
 
-            price_el = await card.query_selector('.price')
-            price = await price_el.text_content() if price_el else "免费"
+    refreshed = await asyncio.gather(*(refresh_one(url) for url in stale_urls))
+    return f"已刷新 {sum(refreshed)}/{len(stale_urls)} 门过期课程"
 
-            results.append({
-                "title": title.strip(),
-                "url": url,
-                "description": desc.strip(),
-                "price": price.strip()
-            })
 
-        output = f"【{teacher_name}】相关课程：\n\n"
-        for idx, course in enumerate(results, start=1):
-            output += f"{idx}. {course['title']}\n"
-            output += f"   描述: {course['description']}\n"
-            output += f"   链接: {course['url']}\n"
-            output += f"   价格: {course['price']}\n\n"
+async def _scrape_courses_by_teacher(teacher_name: str, limit: int,
+                                     ctx: Optional[Context] = None) -> List[Dict[str, str]]:
+    """抓取教师课程列表，按需翻页，返回课程记录列表"""
+    await _require_login()
 
-        return output
+    search_url = PROFILE.url("teacher_courses", teacher_name)
+    courses = iter_courses_fast("search_courses_by_teacher", search_url, "course_list", COURSE_CARD_SCHEMA, limit)
+    results = await collect_courses(courses, limit, ctx)
+    _record_courses(results, "search_courses_by_teacher")
+    return results
 
+
+@mcp.tool()
+@traced("search_courses_by_teacher")
+@dispatched
+async def search_courses_by_teacher(teacher_name: str, limit: int = 5, format: str = "text",
+                                   timeout: Optional[float] = None, ctx: Context = None) -> str:
+    """根据教师名称搜索课程，format 为 json 时返回结构化结果，timeout 为本次调用最多等待的秒数"""
+    try:
+        results = await result_cache.get_or_fetch(
+            "search_courses_by_teacher", {"teacher_name": teacher_name, "limit": limit},
+            lambda: _scrape_courses_by_teacher(teacher_name, limit, ctx), timeout
+        )
+    except ScrapeError as e:
+        return _reply_error(str(e), format)
     except Exception as e:
-        return f"搜索课程时出错: {str(e)}"
+        return _reply_error(f"搜索课程时出错: {str(e)}", format)
+
+    courses = _display_courses(results)
+    if format == "json":
+        return courses_json(courses, teacher_name=teacher_name)
+    if not courses:
+        return f'未找到"{teacher_name}"的课程。'
+
+    return format_courses(f"【{teacher_name}】相关课程：", courses,
+                          [("描述", "description"), ("链接", "url"), ("价格", "price")], hide=())
 
 
 @mcp.tool()
+@traced("favorite_course")
+@dispatched
 async def favorite_course(course_url: str) -> str:
     """收藏指定课程"""
     login_status = await ensure_browser()
@@ -354,125 +866,315 @@ async def favorite_course(course_url: str) -> str:
         return "请先登录慕课网账号"
 
     try:
-        await main_page.goto(course_url, timeout=60000)
-        await asyncio.sleep(3)
-
-        # 点击收藏按钮
-        like_btn = await main_page.query_selector('.like-btn')
-        if like_btn:
-            is_liked = await like_btn.get_attribute("data-liked")
-            if is_liked == "true":
-                return "该课程已收藏"
-            await like_btn.click()
-            return "课程收藏成功。"
-        else:
-            return "未找到收藏按钮，请检查页面结构或是否已登录。"
+        async with tool_page("favorite_course") as page:
+            await goto_ready(page, course_url, "course_detail", Budget("favorite_course"))
+
+            # 点击收藏按钮
+            like_btn = await query_first(page, "like_button")
+            if like_btn:
+                is_liked = await like_btn.get_attribute("data-liked")
+                if is_liked == "true":
+                    return "该课程已收藏"
+                await like_btn.click()
+                return "课程收藏成功。"
+            else:
+                return "未找到收藏按钮，请检查页面结构或是否已登录。"
 
     except Exception as e:
-        return f"收藏失败: {str(e)}"
+        return _reply_error(f"收藏失败: {str(e)}", "text")
+
+
+async def _scrape_contents(content_type: str, keyword: str, limit: int) -> List[Dict[str, str]]:
+    """在独立页面中搜索单一类型的内容"""
+    async with tool_page("search_contents") as page:
+        url = PROFILE.url(CONTENT_ROUTES[content_type], keyword)
+        await goto_ready(page, url, "content_list", Budget("search_contents"))
+        items = await extract_cards(page, CONTENT_ITEM_SCHEMA, limit)
+    for item in items:
+        item["title"] = item["title"] or "无标题"
+    return items
+
+
+async def _timed_contents(content_type: str, keyword: str, limit: int) -> Dict[str, Any]:
+    """搜索单一类型内容并计时，超过截止时间的类型单独报告超时"""
+    start = time.perf_counter()
+    error = None
+    try:
+        items = await asyncio.wait_for(_scrape_contents(content_type, keyword, limit), CONTENT_DEADLINE)
+    except asyncio.TimeoutError:
+        items, error = [], f"超过 {CONTENT_DEADLINE:.0f} 秒未返回"
+    except Exception as e:
+        items, error = [], str(e)
+    return {
+        "type": content_type,
+        "items": items,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000),
+        "error": error,
+    }
+
+
+async def _scrape_all_contents(keyword: str, content_type: str, limit: int) -> List[Dict[str, Any]]:
+    await ensure_browser()
+    content_types = list(CONTENT_ROUTES) if content_type == "all" else [content_type]
+    return list(await asyncio.gather(*(_timed_contents(t, keyword, limit) for t in content_types)))
 
 
 @mcp.tool()
-async def search_contents(keyword: str, content_type: str = "all", limit: int = 5) -> str:
+@traced("search_contents")
+@dispatched
+async def search_contents(keyword: str, content_type: str = "all", limit: int = 5, format: str = "text",
+                          timeout: Optional[float] = None) -> str:
     """
     根据关键字搜索内容：
     content_type 支持: all, comment, column, tutorial, note
+    all 模式下各类型在独立页面中并发搜索；format 为 json 时返回结构化结果
+    timeout 为本次调用最多等待的秒数；相同参数的并发调用共享同一次搜索
     """
-    search_map = {
-        "comment": "https://www.imooc.com/comment/list?search=",
-        "column": "https://www.imooc.com/column/list?search=",
-        "tutorial": "https://www.imooc.com/article/list?search=",
-        "note": "https://www.imooc.com/note/list?search="
-    }
+    if content_type != "all" and content_type not in CONTENT_ROUTES:
+        return _reply_error(f"不支持的内容类型: {content_type}", format)
 
-    if content_type != "all" and content_type not in search_map:
-        return f"不支持的内容类型: {content_type}"
-
-    result = ""
-    if content_type == "all":
-        for key, base_url in search_map.items():
-            url = base_url + keyword
-            await main_page.goto(url, timeout=60000)
-            await asyncio.sleep(3)
-
-            items = await main_page.query_selector_all(".item-box")[:limit]
-            result += f"\n--- {key.upper()} 搜索结果 ---\n"
-            if not items:
-                result += "无结果\n"
-                continue
-            for item in items:
-                title_el = await item.query_selector("h4 a")
-                title = await title_el.text_content() if title_el else "无标题"
-                link = await title_el.get_attribute("href") if title_el else ""
-                result += f"- {title}: https://www.imooc.com{link}\n"
-    else:
-        base_url = search_map[content_type]
-        url = base_url + keyword
-        await main_page.goto(url, timeout=60000)
-        await asyncio.sleep(3)
-
-        items = await main_page.query_selector_all(".item-box")[:limit]
-        result += f"\n--- {content_type.upper()} 搜索结果 ---\n"
-        if not items:
-            result += "无结果\n"
+    args = {"keyword": keyword, "content_type": content_type, "limit": limit}
+    try:
+        sections = await result_cache.flights.do(
+            make_key("search_contents", args), lambda: _scrape_all_contents(keyword, content_type, limit), timeout
+        )
+    except Exception as e:
+        return _reply_error(f"搜索内容时出错: {str(e)}", format)
+
+    if format == "json":
+        return to_json({"keyword": keyword, "sections": sections})
+
+    lines = [""]
+    for section in sections:
+        lines.append(f"--- {section['type'].upper()} 搜索结果（{section['elapsed_ms']}ms）---")
+        if section["error"]:
+            lines.append(f"搜索失败: {section['error']}")
+        elif not section["items"]:
+            lines.append("无结果")
         else:
-            for item in items:
-                title_el = await item.query_selector("h4 a")
-                title = await title_el.text_content() if title_el else "无标题"
-                link = await title_el.get_attribute("href") if title_el else ""
-                result += f"- {title}: https://www.imooc.com{link}\n"
+            lines.extend(f"- {item['title']}: {item['url']}" for item in section["items"])
+        lines.append("")
+    return "\n".join(lines)
 
-    return result
+
+def _iter_recommended(tool: str, category: str, limit: int,
+                      max_pages: int = MAX_RESULT_PAGES) -> AsyncIterator[List[Dict[str, str]]]:
+    url = PROFILE.url(RECOMMEND_ROUTES[category])
+    # 体系课专题页没有分页
+    if category == "system":
+        return iter_courses_fast(tool, url, "course_list", OPEN_COURSE_SCHEMA, limit, max_pages=1)
+    return iter_courses_fast(tool, url, "course_list", COURSE_CARD_SCHEMA, limit, max_pages)
+
+
+async def _scrape_recommended(category: str, limit: int, ctx: Optional[Context] = None) -> List[Dict[str, str]]:
+    courses = _iter_recommended("recommend_courses", category, limit)
+    results = await collect_courses(courses, limit, ctx)
+    _record_courses(results, "recommend_courses")
+    return results
 
 
 @mcp.tool()
-async def recommend_courses(category: str = "free", limit: int = 5) -> str:
+@traced("recommend_courses")
+@dispatched
+async def recommend_courses(category: str = "free", limit: int = 5, format: str = "text",
+                            timeout: Optional[float] = None, ctx: Context = None) -> str:
     """
     推荐课程：支持 free(免费？), real(实战？), system(体系？)
+    format 为 json 时返回结构化结果，timeout 为本次调用最多等待的秒数
     """
-    category_map = {
-        "free": "https://www.imooc.com/course/list?price=1",
-        "real": "https://www.imooc.com/course/list?courseType=2",
-        "system": "https://www.imooc.com/special/opencourse"
-    }
+    if category not in RECOMMEND_ROUTES:
+        return _reply_error(f"不支持的分类: {category}", format)
 
-    if category not in category_map:
-        return f"不支持的分类: {category}"
+    try:
+        results = await result_cache.flights.do(
+            make_key("recommend_courses", {"category": category, "limit": limit}),
+            lambda: _scrape_recommended(category, limit, ctx), timeout
+        )
+    except Exception as e:
+        return _reply_error(f"获取推荐课程时出错: {str(e)}", format)
 
-    url = category_map[category]
-    await main_page.goto(url, timeout=60000)
-    await asyncio.sleep(5)
+    courses = _display_courses(results)
+    if format == "json":
+        return courses_json(courses, category=category)
+    return format_courses(f"【推荐 - {category}】课程：", courses, [("描述", "description"), ("链接", "url")], hide=())
 
-    if category == "system":
-        course_cards = await main_page.query_selector_all('.open-course-item')
+
+async def _with_details(batch: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """为一批课程并发补充详情字段，单门课程失败时保留列表字段"""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def enrich(course: Dict[str, str]) -> Dict[str, str]:
+        async with semaphore:
+            try:
+                detail = await result_cache.get_or_fetch(
+                    "get_course_details", {"url": course["url"]},
+                    lambda: _scrape_course_details(course["url"])
+                )
+            except Exception as e:
+                logger.warning("获取课程详情失败 %s: %s", course["url"], e)
+                return course
+        merged = dict(course)
+        merged.update({k: v for k, v in detail.items() if v})
+        return merged
+
+    return list(await asyncio.gather(*(enrich(course) for course in batch)))
+
+
+async def _export_batches(source: str, query: str, limit: int,
+                          with_details: bool) -> AsyncIterator[List[Dict[str, str]]]:
+    """按来源逐批产出待导出的课程记录"""
+    if source == "catalog":
+        remaining = limit
+        for chunk in catalog.iter_courses(EXPORT_CHUNK_SIZE):
+            yield chunk[:remaining]
+            remaining -= len(chunk)
+            if remaining <= 0:
+                break
+        return
+
+    if source == "search":
+        await _require_login()
+        await ensure_browser()
+        courses = iter_courses(
+            "search_courses", PROFILE.url("search_course", query), "search", SEARCH_CARD_SCHEMA, limit,
+            max_pages=EXPORT_MAX_PAGES,
+            fallback=lambda page, budget: _search_via_form(page, query, budget)
+        )
+    elif source == "teacher":
+        await _require_login()
+        courses = iter_courses_fast(
+            "search_courses_by_teacher", PROFILE.url("teacher_courses", query),
+            "course_list", COURSE_CARD_SCHEMA, limit, max_pages=EXPORT_MAX_PAGES
+        )
     else:
-        course_cards = await main_page.query_selector_all('.course-card')
+        courses = _iter_recommended("recommend_courses", query, limit, max_pages=EXPORT_MAX_PAGES)
+
+    if not with_details:
+        async for batch in courses:
+            _record_courses(batch, f"export_{source}")
+            yield batch
+        return
+
+    # 列表生成器暂停时仍占用列表页，此时补充详情会再向页面池借页面，池满时互相等待；
+    # 因此先取完列表、归还列表页，再分批补充详情
+    listed = []
+    async for batch in courses:
+        listed.extend(batch)
+    for start in range(0, len(listed), EXPORT_CHUNK_SIZE):
+        batch = await _with_details(listed[start:start + EXPORT_CHUNK_SIZE])
+        _record_courses(batch, f"export_{source}")
+        yield batch
+
+
+async def _export_courses(source: str, query: str, file_format: str, limit: int, with_details: bool) -> Dict:
+    if source not in ("search", "teacher", "recommend", "catalog"):
+        raise ScrapeError(f"不支持的导出来源: {source}")
+    if source == "recommend" and query not in RECOMMEND_ROUTES:
+        raise ScrapeError(f"不支持的分类: {query}")
+    if file_format not in EXPORT_FORMATS:
+        raise ScrapeError(f"不支持的导出格式: {file_format}")
+
+    filename = f"export_{source}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[file_format]}"
+    path = os.path.join(DATA_DIR, filename)
+    return await export_stream(_export_batches(source, query, limit, with_details), path, file_format)
 
-    results = []
-    for card in course_cards[:limit]:
-        title_el = await card.query_selector('.course-card-name') or await card.query_selector('.title')
-        title = await title_el.text_content() if title_el else "未知标题"
 
-        link_el = await card.query_selector('a')
-        href = await link_el.get_attribute('href') if link_el else ""
-        url = f"https://www.imooc.com{href}" if href else ""
+@mcp.tool()
+@traced("export_courses")
+@dispatched
+async def export_courses(source: str = "search", query: str = "", file_format: str = "csv",
+                         limit: int = 100, with_details: bool = False) -> str:
+    """
+    将课程记录分块导出到 DATA_DIR 下的文件：
+    source 支持 search(关键词), teacher(讲师名), recommend(free/real/system), catalog(本地目录)
+    file_format 支持 csv, jsonl, parquet；with_details 为 True 时逐门补充课程详情
+    """
+    try:
+        stats = await _export_courses(source, query, file_format, limit, with_details)
+    except ScrapeError as e:
+        return _reply_error(str(e), "text")
+    except Exception as e:
+        return _reply_error(f"导出课程时出错: {str(e)}", "text")
+
+    return (f"已导出 {stats['rows']} 条记录到 {stats['path']}，"
+            f"用时 {stats['seconds']} 秒（{stats['rows_per_second']} 条/秒）")
 
-        desc_el = await card.query_selector('.course-desc') or await card.query_selector('.desc')
-        desc = await desc_el.text_content() if desc_el else ""
 
-        results.append({
-            "title": title.strip(),
-            "url": url,
-            "description": desc.strip()
-        })
+@mcp.tool()
+@traced("diagnostics")
+async def diagnostics(format: str = "text") -> str:
+    """
+    返回运行诊断信息：各工具耗时分位数（p50/p95/p99）、导航/等待/抽取阶段耗时、
+    各页面类型的就绪耗时与就绪/无结果/超时次数、Playwright 往返次数、选择器回退次数、已改用备选选择器（页面结构可能变化）的字段，
+    浏览器内存、页面回收与上下文重启情况，以及工作进程模式下各进程的排队深度。
+    format 支持 text, json, prometheus
+    """
+    if format == "prometheus":
+        return prometheus_text()
+
+    stats = trace_stats()
+    stats["page_pool"] = page_pool.stats() if page_pool is not None else None
+    stats["memory"] = watchdog.stats()
+    stats["workers"] = worker_pool.stats() if worker_pool.enabled else None
+    stats["in_flight"] = result_cache.flights.in_flight()
+    stats["selectors"] = selector_resolver.stats()
+    stats["selectors_need_attention"] = selector_resolver.needs_attention()
+    if format == "json":
+        return to_json(stats)
+
+    lines = ["【工具耗时】"]
+    lines.extend(
+        f"- {tool}: {s['count']} 次，p50 {s['p50_ms']}ms，p95 {s['p95_ms']}ms，p99 {s['p99_ms']}ms，"
+        f"最长 {s['max_ms']}ms，异常 {s['errors']} 次"
+        for tool, s in stats["tools"].items()
+    )
+    lines.append("【阶段耗时】")
+    lines.extend(
+        f"- {name}: {s['count']} 次，p50 {s['p50_ms']}ms，p95 {s['p95_ms']}ms，p99 {s['p99_ms']}ms"
+        + "".join(f"，{outcome} {n} 次" for outcome, n in s["outcomes"].items())
+        for name, s in stats["spans"].items()
+    )
+    lines.append("【计数器】")
+    lines.extend(f"- {name}: {value}" for name, value in stats["counters"].items())
+    memory, pool = stats["memory"], stats["page_pool"]
+    lines.append("【内存】")
+    if memory.get("sampled_at"):
+        rss = f"{memory['browser_rss_mb']}MB" if memory["browser_rss_mb"] is not None else "未知（未安装 psutil）"
+        lines.append(f"- 浏览器 {rss}，页面 JS 堆 {memory['js_heap_mb']}MB，上限 {memory['max_rss_mb']:g}MB")
+    lines.append(f"- 上下文重启 {memory['restarts']} 次，推迟 {memory['skipped_restarts']} 次"
+                 + (f"，页面回收 {pool['recycled']} 次" if pool else ""))
+    if stats["workers"]:
+        workers = stats["workers"]
+        lines.append(f"【工作进程】排队 {workers['queue_depth']}，执行中 {workers['running']}")
+        lines.extend(
+            f"- {w['index']}: 排队 {w['queued']}，执行中 {w['running']}，完成 {w['completed']}，"
+            f"失败 {w['failed']}，重启 {w['restarts']} 次"
+            for w in workers["per_worker"]
+        )
+    lines.append("【选择器】")
+    lines.extend(
+        f"- {scope}: 首选 {s['primary']}，回退 {s['fallback']}（{s['fallback_rate']:.0%}），未命中 {s['miss']}"
+        + (f"，当前优先 {s['preferred']}" if scope in stats["selectors_need_attention"] else "")
+        for scope, s in stats["selectors"].items() if s["fallback"] or s["miss"]
+    )
+    return "\n".join(lines) + "\n"
+
+
+async def export_command(source: str, query: str, file_format: str, limit: int):
+    """命令行导出功能"""
+    try:
+        stats = await _export_courses(source, query, file_format, limit, with_details=False)
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(f"发生错误：{str(e)}")
+        import traceback
+        traceback.print_exc()
 
-    output = f"【推荐 - {category}】课程：\n\n"
-    for idx, course in enumerate(results, start=1):
-        output += f"{idx}. {course['title']}\n"
-        output += f"   描述: {course['description']}\n"
-        output += f"   链接: {course['url']}\n\n"
 
-    return output
+async def worker_command():
+    """工作进程入口：由前端进程启动，通过标准输入输出收发工具调用"""
+    async with lifespan(mcp):
+        await serve_worker({name: _worker_entry(name, func) for name, func in _worker_tools.items()})
 
 
 async def search_command(keywords: str, limit: int = 10):
@@ -495,7 +1197,7 @@ async def search_command(keywords: str, limit: int = 10):
 
 # 启动 MCP 服务
 if __name__ == "__main__":
-    import sys
+    setup_logging()
     try:
         if len(sys.argv) > 1:
             if sys.argv[1] == "login":
@@ -508,9 +1210,20 @@ if __name__ == "__main__":
                 limit = int(sys.argv[3]) if len(sys.argv) > 3 else 10
                 print(f"开始搜索：{keywords}，限制数量：{limit}")
                 asyncio.run(search_command(keywords, limit))
+            elif sys.argv[1] == "export":
+                # 导出课程：python rsq.py export <来源> <关键词> [格式] [数量]
+                source = sys.argv[2] if len(sys.argv) > 2 else "search"
+                query = sys.argv[3] if len(sys.argv) > 3 else "计算机网络"
+                file_format = sys.argv[4] if len(sys.argv) > 4 else "csv"
+                limit = int(sys.argv[5]) if len(sys.argv) > 5 else 100
+                print(f"开始导出：{source} / {query}，格式：{file_format}，限制数量：{limit}")
+                asyncio.run(export_command(source, query, file_format, limit))
+            elif sys.argv[1] == "worker":
+                # 工作进程模式下由前端进程启动，无需手动运行
+                asyncio.run(worker_command())
         else:
             # 启动 MCP 服务
-            print("启动 MCP 服务...")
+            logger.info("启动 MCP 服务...")
             mcp.run()
     except Exception as e:
         print(f"程序运行出错：{str(e)}")
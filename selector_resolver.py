@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from tracing import register_metrics
+
+# 学习到的选择器顺序每隔多少次记录写盘一次（命中的选择器变化时立即写盘）
+SAVE_EVERY = int(os.environ.get("SELECTOR_SAVE_EVERY", "50"))
+
+logger = logging.getLogger(__name__)
+
+
+class SelectorResolver:
+    """
+    自适应选择器顺序：按作用域（抽取规则字段或页面元素）记录实际命中的候选选择器，
+    下次优先尝试上次命中的那个，并持久化学习结果。
+    candidates 始终为 site_profile 中的原始顺序，命中非首选选择器即视为回退，
+    回退比例上升通常意味着页面结构发生了变化。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._winners = {}
+        self._primary = {}
+        self._stats = defaultdict(lambda: {"primary": 0, "fallback": 0, "miss": 0})
+        self._pending = 0
+        self._load()
+
+    def attach(self, path: str):
+        """指定持久化文件并加载已学习的顺序"""
+        self.path = path
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._winners.update(state.get("winners", {}))
+        for scope, stats in state.get("stats", {}).items():
+            self._stats[scope].update(stats)
+
+    def save(self):
+        self._pending = 0
+        if not self.path:
+            return
+        state = {"saved_at": time.time(), "winners": self._winners, "stats": dict(self._stats)}
+        # 先写临时文件再替换，多个工作进程同时保存时不会留下写了一半的文件
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("保存选择器顺序失败: %s", e)
+
+    def order(self, scope: str, candidates: List[str]) -> List[str]:
+        """返回本次应尝试的顺序：上次命中的选择器排在最前"""
+        winner = self._winners.get(scope)
+        if winner is None or winner == candidates[0] or winner not in candidates:
+            return list(candidates)
+        return [winner] + [selector for selector in candidates if selector != winner]
+
+    def record(self, scope: str, candidates: List[str], hits: Dict[str, int], misses: int = 0):
+        """记录一次查找结果：hits 为 选择器 → 命中次数，misses 为未命中的次数"""
+        self._primary[scope] = candidates[0]
+        stats = self._stats[scope]
+        stats["miss"] += misses
+        for selector, n in hits.items():
+            stats["primary" if selector == candidates[0] else "fallback"] += n
+        self._pending += 1
+
+        hits = {selector: n for selector, n in hits.items() if n > 0}
+        if hits:
+            winner = max(hits, key=hits.get)
+            previous = self._winners.get(scope, candidates[0])
+            if winner != previous:
+                self._winners[scope] = winner
+                if winner == candidates[0]:
+                    logger.info("[选择器] %s 首选选择器恢复命中: %s", scope, winner)
+                else:
+                    logger.warning("[选择器] %s 首选选择器 %s 未命中，改为优先使用 %s", scope, candidates[0], winner)
+                self.save()
+                return
+        if self._pending >= SAVE_EVERY:
+            self.save()
+
+    def order_schema(self, schema: Dict) -> Dict:
+        """按学习到的顺序重排抽取规则中的卡片与字段选择器"""
+        name = schema["name"]
+        return {
+            "cards": self.order(f"{name}.cards", schema["cards"]),
+            "fields": {
+                field: {**spec, "selectors": self.order(f"{name}.{field}", spec["selectors"])}
+                for field, spec in schema["fields"].items()
+            },
+        }
+
+    def record_schema(self, schema: Dict, ordered: Dict, card_index: int, hits: Dict[str, List[int]],
+                      total: int) -> int:
+        """
+        记录一次抽取的命中情况。card_index 为命中的卡片选择器下标（-1 表示未找到卡片），
+        hits 为 字段 → 各候选选择器（按 ordered 中的顺序）的命中次数，total 为卡片数。
+        返回由非第一个尝试的选择器命中的次数。
+        """
+        name = schema["name"]
+        if card_index < 0:
+            self.record(f"{name}.cards", schema["cards"], {}, misses=1)
+            return 0
+        self.record(f"{name}.cards", schema["cards"], {ordered["cards"][card_index]: 1})
+        fallbacks = 1 if card_index > 0 else 0
+        if total <= 0:
+            return fallbacks
+        for field, counts in hits.items():
+            tried = ordered["fields"][field]["selectors"]
+            self.record(f"{name}.{field}", schema["fields"][field]["selectors"],
+                        {tried[i]: n for i, n in enumerate(counts) if n}, misses=total - sum(counts))
+            fallbacks += sum(counts[1:])
+        return fallbacks
+
+    def stats(self) -> Dict[str, Dict]:
+        """各作用域的命中统计；fallback_rate 高的作用域需要检查页面结构"""
+        result = {}
+        for scope, stats in self._stats.items():
+            found = stats["primary"] + stats["fallback"]
+            result[scope] = {
+                **stats,
+                "fallback_rate": round(stats["fallback"] / found, 3) if found else 0.0,
+                "preferred": self._winners.get(scope),
+            }
+        return result
+
+    def needs_attention(self) -> List[str]:
+        """已改用非首选选择器的作用域"""
+        return [scope for scope, winner in self._winners.items()
+                if scope in self._primary and winner != self._primary[scope]]
+
+    def prometheus_lines(self) -> List[str]:
+        lines = ["# TYPE imooc_selector_lookups_total counter"]
+        for scope, stats in self._stats.items():
+            lines.extend(
+                f'imooc_selector_lookups_total{{scope="{scope}",result="{result}"}} {stats[result]}'
+                for result in ("primary", "fallback", "miss")
+            )
+        return lines
+
+
+# 所有抽取与元素查找共用的解析器，rsq.py 启动时指定持久化文件
+resolver = SelectorResolver()
+register_metrics(resolver.prometheus_lines)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tracing import count
+
+# 单个调用方等待结果的默认超时（秒），0 表示不限制
+CALL_TIMEOUT = float(os.environ.get("CALL_TIMEOUT", "0"))
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并相同参数的并发调用：同一个键同时只执行一次操作，所有调用方共享结果。
+    每个调用方可单独超时或被取消，不影响其他调用方；全部调用方都离开后才取消共享的操作。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, f=flight: self._forget(key, f))
+        else:
+            count("coalesced_calls")
+
+        timeout = CALL_TIMEOUT if timeout is None else timeout
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout if timeout > 0 else None)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"等待超过 {timeout:g} 秒未返回")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import os
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+# 站点配置：根地址、路由模板、各页面类型的就绪条件、抽取规则与页面元素选择器。
+# 所有工具、HTTP 直连抽取和基准测试共用同一份配置，页面结构变化时只需修改这里
+# （或通过 SITE_PROFILE 指定的 JSON 文件覆盖），无需逐个修改工具。
+DEFAULT_PROFILE = {
+    "base_url": "https://www.imooc.com",
+    # 路由模板，{query} 处填入 URL 编码后的参数
+    "routes": {
+        "home": "/",
+        "search_course": "/search/course?words={query}",
+        "course_search_list": "/course/list?words={query}",
+        "teacher_courses": "/course/list?teacher={query}",
+        "course_detail": "/learn/{query}",
+        "recommend_free": "/course/list?price=1",
+        "recommend_real": "/course/list?courseType=2",
+        "recommend_system": "/special/opencourse",
+        "comment_list": "/comment/list?search={query}",
+        "column_list": "/column/list?search={query}",
+        "tutorial_list": "/article/list?search={query}",
+        "note_list": "/note/list?search={query}",
+    },
+    # 各页面类型的就绪条件：selectors 中任一元素出现即视为就绪，列表页只看卡片本身；
+    # empty 为“无结果”提示，显示时立即结束等待而不是等到超时；
+    # responses 为可选的接口 URL 片段，命中任一响应也视为就绪
+    "pages": {
+        "home": {"selectors": [".user-card-box", ".js-login-btn", "#js-search-input", ".search-input"]},
+        "search": {"selectors": [".search-related-card", ".course-item"],
+                   "empty": [".search-empty", ".nodata", ".empty"]},
+        "course_list": {"selectors": [".course-card", ".open-course-item"],
+                        "empty": [".course-empty", ".nodata", ".empty"]},
+        "course_detail": {"selectors": ["h2.course-title", ".course-description", ".like-btn"]},
+        "content_list": {"selectors": [".item-box"], "empty": [".no-data", ".nodata", ".empty"]},
+    },
+    # 抽取规则：cards 为卡片容器的候选选择器，fields 为 字段 → 按优先级排列的候选选择器
+    # attr 为空时取元素文本，否则取对应属性；required 为判定抽取成功所需的字段
+    "schemas": {
+        "search_card": {
+            "cards": [".search-related-card", ".course-item"],
+            "fields": {
+                "title": {"selectors": [".search-related-card-title", ".search-related-card-name", "h3, h4"]},
+                "url": {"selectors": ["a"], "attr": "href"},
+                "description": {"selectors": [".search-related-card-desc", ".course-desc"]},
+                "price": {"selectors": [".search-related-card-price", ".price"]},
+            },
+            "required": ["title", "url"],
+        },
+        "course_card": {
+            "cards": [".course-card"],
+            "fields": {
+                "title": {"selectors": [".course-card-name", ".title"]},
+                "url": {"selectors": ["a"], "attr": "href"},
+                "description": {"selectors": [".course-card-desc", ".course-desc", ".desc"]},
+                "price": {"selectors": [".course-card-price", ".price"]},
+            },
+            "required": ["title", "url"],
+        },
+        # 体系课专题页：卡片容器不同，字段规则与课程卡片一致
+        "open_course": {
+            "cards": [".open-course-item"],
+            "fields": "course_card",
+            "required": ["title", "url"],
+        },
+        # 手记、专栏、教程、评价等内容列表
+        "content_item": {
+            "cards": [".item-box"],
+            "fields": {
+                "title": {"selectors": ["h4 a"]},
+                "url": {"selectors": ["h4 a"], "attr": "href"},
+            },
+        },
+        # 课程详情页：以整个文档作为唯一的“卡片”
+        "course_detail": {
+            "cards": [":root"],
+            "fields": {
+                "title": {"selectors": ["h2.course-title", ".course-title", "h1"]},
+                "description": {"selectors": [".course-description", ".course-desc"]},
+                "teacher": {"selectors": [".teacher-name"]},
+                "level": {"selectors": [".course-infos-item:nth-child(2)"]},
+                "duration": {"selectors": [".course-infos-item:nth-child(3)"]},
+                "students": {"selectors": [".target-user"]},
+            },
+            "required": ["title", "description"],
+        },
+    },
+    # 列表页加载卡片数据的接口：responses 为接口 URL 片段，items 为记录列表在 JSON 中的候选路径，
+    # fields 为 字段 → 候选键（点分路径）。id 只用于在缺少 url 时按 course_detail 路由拼出地址
+    "captures": {
+        "search": {
+            "responses": ["/search/courseajax", "/api/search/course"],
+            "items": ["data.list", "data.courses", "result.list", "list"],
+            "fields": "course_json",
+        },
+        "course_list": {
+            "responses": ["/course/ajaxlist", "/api/course/list"],
+            "items": ["data.list", "data.courses", "result.list", "list"],
+            "fields": "course_json",
+        },
+    },
+    # 接口记录的字段映射，供 captures 引用
+    "json_fields": {
+        "course_json": {
+            "title": ["name", "title"],
+            "url": ["url", "link"],
+            "id": ["id", "cid", "course_id"],
+            "description": ["short_description", "desc", "description"],
+            "price": ["price", "discount_price", "sale_price"],
+            "teacher": ["teacher_name", "teacher.nickname", "author"],
+            "level": ["difficulty", "level"],
+            "duration": ["duration", "time"],
+            "students": ["numbers", "learn_num", "join_num"],
+        },
+    },
+    # 交互用的页面元素，按优先级排列的候选选择器
+    "elements": {
+        "user_info": [".user-card-box"],
+        "login_button": [".js-login-btn", 'text="登录"'],
+        "search_input": [
+            "#js-search-input",
+            ".search-input",
+            'input[type="search"]',
+            'input[placeholder*="搜索"]',
+            'input[class*="search"]',
+            'input[id*="search"]',
+        ],
+        "search_button": [".search-btn"],
+        "course_tab": [".search-nav-item >> text=课程"],
+        "like_button": [".like-btn"],
+    },
+}
+
+# 指向 JSON 文件时，其中的各部分按键覆盖默认配置（例如镜像站或预发环境）
+SITE_PROFILE = os.environ.get("SITE_PROFILE", "")
+# 设置 RESPONSE_CAPTURE=0 时不监听数据接口，只从渲染后的 DOM 抽取。
+# 数据接口只在使用接口数据的调用方（rsq.py 的 iter_courses）中作为就绪条件，
+# 其他调用方（如 imooc_scraper.py）仍等卡片渲染
+RESPONSE_CAPTURE = os.environ.get("RESPONSE_CAPTURE", "1") != "0"
+
+
+class SiteProfile:
+    """编译后的站点配置：路由补全为绝对地址，抽取规则展开引用并校验"""
+
+    def __init__(self, data: Dict):
+        self.base_url = data["base_url"].rstrip("/")
+        self.routes = {name: self.base_url + path for name, path in data["routes"].items()}
+        self.captures = {} if not RESPONSE_CAPTURE else {
+            page_type: {
+                "responses": list(spec["responses"]),
+                "items": list(spec["items"]),
+                "fields": data["json_fields"][spec["fields"]] if isinstance(spec["fields"], str) else spec["fields"],
+            }
+            for page_type, spec in data.get("captures", {}).items()
+        }
+        self.pages = {
+            page_type: {
+                "selectors": list(spec["selectors"]),
+                # 等待就绪时合并为一个选择器，只需一次往返
+                "selector": ", ".join(spec["selectors"]),
+                "empty": ", ".join(spec.get("empty", [])),
+                "responses": list(spec.get("responses", [])),
+            }
+            for page_type, spec in data["pages"].items()
+        }
+        self.schemas = {name: self._compile_schema(name, data["schemas"]) for name in data["schemas"]}
+        self.elements = {name: list(selectors) for name, selectors in data["elements"].items()}
+
+    @staticmethod
+    def _compile_schema(name: str, schemas: Dict) -> Dict:
+        schema = schemas[name]
+        fields = schema["fields"]
+        # fields 为字符串时引用另一条规则的字段
+        if isinstance(fields, str):
+            fields = schemas[fields]["fields"]
+        compiled = {
+            "name": name,
+            "cards": list(schema["cards"]),
+            "fields": {
+                field: {"selectors": list(spec["selectors"]), **({"attr": spec["attr"]} if spec.get("attr") else {})}
+                for field, spec in fields.items()
+            },
+            "required": list(schema.get("required", [])),
+        }
+        missing = [field for field in compiled["required"] if field not in compiled["fields"]]
+        if not compiled["cards"] or missing:
+            raise ValueError(f"抽取规则 {name} 无效: 缺少卡片选择器或必要字段 {missing}")
+        return compiled
+
+    def url(self, route: str, query: Optional[str] = None) -> str:
+        """按路由模板生成地址"""
+        template = self.routes[route]
+        return template.format(query=quote(str(query))) if query is not None else template
+
+    def selectors(self, element: str) -> List[str]:
+        return self.elements[element]
+
+
+def _merge(base: Dict, override: Dict) -> Dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_profile(path: str = SITE_PROFILE, base_url: Optional[str] = None) -> SiteProfile:
+    """加载并编译站点配置；IMOOC_BASE_URL 优先于配置文件中的根地址"""
+    data = DEFAULT_PROFILE
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = _merge(DEFAULT_PROFILE, json.load(f))
+    base_url = base_url or os.environ.get("IMOOC_BASE_URL")
+    if base_url:
+        data = {**data, "base_url": base_url}
+    return SiteProfile(data)
+
+
+# 启动时编译一次，各模块共用
+PROFILE = load_profile()
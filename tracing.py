@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# 每个工具/阶段保留的最近耗时样本数
+TRACE_SAMPLES = int(os.environ.get("TRACE_SAMPLES", "500"))
+# 设置 TRACE_LOG=1 时每次工具调用结束输出一行追踪日志，默认关闭
+TRACE_LOG = os.environ.get("TRACE_LOG", "0") != "0"
+# 诊断日志级别，日志写到标准错误：stdio 传输下标准输出是 MCP 的 JSON-RPC 通道
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# 大于 0 时在该端口提供 Prometheus 文本格式的指标
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# 常用计数器名称
+ROUNDTRIPS = "playwright_roundtrips"
+SELECTOR_FALLBACKS = "selector_fallbacks"
+
+_tool_samples = defaultdict(lambda: deque(maxlen=TRACE_SAMPLES))
+_tool_errors = defaultdict(int)
+_span_samples = defaultdict(lambda: deque(maxlen=TRACE_SAMPLES))
+_span_outcomes = defaultdict(lambda: defaultdict(int))
+_counters = defaultdict(int)
+
+_current = contextvars.ContextVar("current_trace", default=None)
+# 其他模块注册的指标输出函数，返回 Prometheus 文本行列表
+_metric_sources = []
+
+logger = logging.getLogger(__name__)
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    """由入口脚本调用：诊断日志输出到标准错误，沿用 [标签] 前缀的消息格式"""
+    logging.basicConfig(stream=sys.stderr, level=level, format="%(message)s")
+
+
+class Trace:
+    """单次工具调用的追踪信息：各阶段耗时与计数器。并发子任务共享同一对象"""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.start = time.perf_counter()
+        self.spans = defaultdict(lambda: [0, 0.0])
+        self.counters = defaultdict(int)
+        # 工具捕获异常后以错误信息作为返回值时置位
+        self.error = False
+
+    def summary(self) -> str:
+        parts = [f"{name}={count}x/{total:.0f}ms" for name, (count, total) in self.spans.items()]
+        parts.extend(f"{name}={value}" for name, value in self.counters.items())
+        return " ".join(parts)
+
+
+def percentile(samples, pct: float) -> float:
+    """最近邻法计算分位数，pct 取 0-100"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summarize(samples) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50), 1),
+        "p95_ms": round(percentile(samples, 95), 1),
+        "p99_ms": round(percentile(samples, 99), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def count(name: str, n: int = 1):
+    """累加计数器，同时计入当前工具调用"""
+    if n <= 0:
+        return
+    _counters[name] += n
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] += n
+
+
+def record(name: str, elapsed_ms: float, outcome: Optional[str] = None):
+    """记录一个阶段的耗时样本；outcome 非空时按结果分别计数（如等待的就绪、无结果、超时）"""
+    _span_samples[name].append(elapsed_ms)
+    if outcome is not None:
+        _span_outcomes[name][outcome] += 1
+    trace = _current.get()
+    if trace is not None:
+        entry = trace.spans[name]
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+
+@contextmanager
+def span(name: str):
+    """记录一个阶段（导航、等待、抽取等）的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def traced(tool: str):
+    """MCP 工具装饰器：为整次调用建立追踪并记录总耗时"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            trace = Trace(tool)
+            token = _current.set(trace)
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                trace.error = True
+                raise
+            finally:
+                _current.reset(token)
+                if trace.error:
+                    _tool_errors[tool] += 1
+                elapsed = (time.perf_counter() - trace.start) * 1000
+                _tool_samples[tool].append(elapsed)
+                if TRACE_LOG:
+                    logger.info("[追踪] %s 用时 %.0fms %s", tool, elapsed, trace.summary())
+        return wrapper
+    return decorator
+
+
+def call_failed() -> bool:
+    """当前工具调用是否已被标记为失败"""
+    trace = _current.get()
+    return trace is not None and trace.error
+
+
+def mark_error():
+    """标记当前工具调用失败：工具捕获异常并返回错误信息时调用，计入错误次数"""
+    trace = _current.get()
+    if trace is not None:
+        trace.error = True
+
+
+def trace_stats() -> Dict:
+    """汇总各工具、各阶段的耗时分位数与计数器"""
+    return {
+        "tools": {
+            tool: {**_summarize(samples), "errors": _tool_errors[tool]}
+            for tool, samples in _tool_samples.items() if samples
+        },
+        "spans": {
+            name: {**_summarize(samples), "outcomes": dict(_span_outcomes[name])}
+            for name, samples in _span_samples.items() if samples
+        },
+        "counters": dict(_counters),
+    }
+
+
+def register_metrics(source):
+    """注册额外的 Prometheus 指标来源"""
+    _metric_sources.append(source)
+
+
+def prometheus_text() -> str:
+    """以 Prometheus 文本格式导出指标"""
+    lines = ["# TYPE imooc_tool_latency_ms summary"]
+    for tool, samples in _tool_samples.items():
+        if not samples:
+            continue
+        for q in (50, 95, 99):
+            lines.append(f'imooc_tool_latency_ms{{tool="{tool}",quantile="{q / 100:g}"}} {percentile(samples, q):.1f}')
+        lines.append(f'imooc_tool_latency_ms_sum{{tool="{tool}"}} {sum(samples):.1f}')
+        lines.append(f'imooc_tool_latency_ms_count{{tool="{tool}"}} {len(samples)}')
+    lines.append("# TYPE imooc_tool_errors_total counter")
+    lines.extend(f'imooc_tool_errors_total{{tool="{tool}"}} {value}' for tool, value in _tool_errors.items())
+    lines.append("# TYPE imooc_span_latency_ms summary")
+    for name, samples in _span_samples.items():
+        if not samples:
+            continue
+        for q in (50, 95, 99):
+            lines.append(f'imooc_span_latency_ms{{span="{name}",quantile="{q / 100:g}"}} {percentile(samples, q):.1f}')
+        lines.append(f'imooc_span_latency_ms_count{{span="{name}"}} {len(samples)}')
+    lines.append("# TYPE imooc_span_outcomes_total counter")
+    lines.extend(
+        f'imooc_span_outcomes_total{{span="{name}",outcome="{outcome}"}} {value}'
+        for name, outcomes in _span_outcomes.items() for outcome, value in outcomes.items()
+    )
+    lines.append("# TYPE imooc_events_total counter")
+    lines.extend(f'imooc_events_total{{name="{name}"}} {value}' for name, value in _counters.items())
+    for source in _metric_sources:
+        lines.extend(source())
+    return "\n".join(lines) + "\n"
+
+
+async def _serve_metrics(reader, writer):
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+    except Exception:
+        pass
+    body = prometheus_text().encode("utf-8")
+    writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+    )
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port: int = METRICS_PORT):
+    """启动只读的指标 HTTP 服务，port 为 0 时不启动"""
+    if port <= 0:
+        return None
+    server = await asyncio.start_server(_serve_metrics, "127.0.0.1", port)
+    logger.info("[追踪] 指标服务已启动: http://127.0.0.1:%d/metrics", port)
+    return server
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from lazy_primitive import LazyPrimitive
+from tracing import count
+
+# 工作进程数，0 表示在当前进程内直接执行工具调用
+WORKERS = int(os.environ.get("WORKERS", "0"))
+# 每个工作进程同时执行的调用数上限，超出部分在前端排队
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", os.environ.get("PAGE_POOL_SIZE", "4")))
+# 关闭工作进程时等待其自行退出的时间（秒）
+WORKER_STOP_TIMEOUT = 10
+# 单条响应的最大长度（字节），导出等工具的结果可能较长
+RESPONSE_LIMIT = 64 * 1024 * 1024
+# 复制浏览器配置时跳过锁文件与缓存目录
+PROFILE_IGNORE = shutil.ignore_patterns("Singleton*", "lockfile", "Cache", "Code Cache", "GPUCache", "Crashpad")
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(Exception):
+    """工作进程异常退出或调用执行失败"""
+
+
+def clone_profile(source: str, target: str):
+    """复制已登录的浏览器配置目录，每个工作进程使用独立副本"""
+    shutil.rmtree(target, ignore_errors=True)
+    try:
+        shutil.copytree(source, target, ignore=PROFILE_IGNORE)
+    except shutil.Error as e:
+        # 个别文件正被占用时跳过，不影响登录状态
+        logger.info("[工作进程] 复制浏览器配置时跳过 %d 个文件", len(e.args[0]))
+
+
+class Worker:
+    """
+    一个工作进程：按行收发 JSON 请求与响应，进程退出后未完成的调用全部失败，
+    下次调用时重新复制浏览器配置并启动。
+    """
+
+    def __init__(self, index: int, command: List[str], profile_source: str, profile_dir: str):
+        self.index = index
+        self.command = command
+        self.profile_source = profile_source
+        self.profile_dir = profile_dir
+        self.process = None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._alive = False
+        self._next_id = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader = None
+        self._slots = LazyPrimitive(asyncio.Semaphore, max(1, WORKER_CONCURRENCY))
+        self._start_lock = LazyPrimitive()
+
+    @property
+    def load(self) -> int:
+        return self.queued + self.running
+
+    async def _ensure_started(self):
+        async with self._start_lock:
+            if self._alive:
+                return
+            if self.process is not None:
+                self.restarts += 1
+                logger.warning("[工作进程] %d 已退出（%s），重新启动", self.index, self.process.returncode)
+            await asyncio.get_running_loop().run_in_executor(None, clone_profile, self.profile_source, self.profile_dir)
+            env = {
+                **os.environ,
+                "WORKERS": "0",
+                "WORKER_ID": str(self.index),
+                "BROWSER_DATA_DIR": self.profile_dir,
+                "METRICS_PORT": "0",
+                "PYTHONIOENCODING": "utf-8",
+            }
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                env=env, limit=RESPONSE_LIMIT
+            )
+            self._alive = True
+            self._reader = asyncio.create_task(self._read_responses(self.process))
+
+    async def _read_responses(self, process):
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except Exception as e:
+            logger.warning("[工作进程] %d 读取响应失败: %s", self.index, e)
+        finally:
+            # 回收已退出的进程，避免留下僵尸进程
+            try:
+                await asyncio.wait_for(process.wait(), WORKER_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+            except Exception:
+                pass
+            if process is self.process:
+                self._alive = False
+                pending, self._pending = self._pending, {}
+                for future in pending.values():
+                    if not future.done():
+                        future.set_exception(WorkerError(f"工作进程 {self.index} 已退出"))
+
+    async def _send(self, message: Dict):
+        self.process.stdin.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+
+    async def call(self, tool: str, args: Dict[str, Any]) -> Any:
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        request_id = None
+        try:
+            try:
+                await self._ensure_started()
+            except OSError as e:
+                raise WorkerError(f"工作进程 {self.index} 启动失败: {str(e)}")
+            self._next_id += 1
+            request_id = self._next_id
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                await self._send({"id": request_id, "tool": tool, "args": args})
+                message = await future
+            except asyncio.CancelledError:
+                # 调用方取消时通知工作进程停止执行
+                if self._alive:
+                    try:
+                        await self._send({"cancel": request_id})
+                    except Exception:
+                        pass
+                raise
+            except (OSError, RuntimeError) as e:
+                raise WorkerError(f"工作进程 {self.index} 不可用: {str(e)}")
+        except WorkerError:
+            self.failed += 1
+            raise
+        finally:
+            if request_id is not None:
+                self._pending.pop(request_id, None)
+            self.running -= 1
+            self._slots.release()
+
+        if "error" in message:
+            self.failed += 1
+            raise WorkerError(message["error"])
+        self.completed += 1
+        return message["result"]
+
+    async def stop(self):
+        """关闭标准输入让工作进程自行退出，超时则强制结束"""
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.stdin.close()
+            await asyncio.wait_for(process.wait(), WORKER_STOP_TIMEOUT)
+        except Exception:
+            process.kill()
+            await process.wait()
+
+    def stats(self) -> Dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self._alive else None,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+        }
+
+
+class WorkerPool:
+    """
+    多进程工作池：每个工作进程拥有独立的 Playwright 与浏览器配置副本，
+    工具调用分派给排队与执行中调用数最少的工作进程。size 为 0 时不启用。
+    """
+
+    def __init__(self, size: int, command: List[str], profile_source: str, profile_root: str):
+        self.size = max(0, size)
+        self.workers = [
+            Worker(index, command, profile_source, os.path.join(profile_root, f"worker_{index}"))
+            for index in range(self.size)
+        ]
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _pick(self) -> Worker:
+        # 负载相同时选累计调用较少的，冷启动阶段也能均匀分散
+        return min(self.workers, key=lambda worker: (worker.load, worker.completed + worker.failed))
+
+    async def call(self, tool: str, args: Dict[str, Any]) -> Any:
+        count("worker_dispatches")
+        return await self._pick().call(tool, args)
+
+    def stats(self) -> Dict:
+        workers = [worker.stats() for worker in self.workers]
+        return {
+            "workers": self.size,
+            "concurrency_per_worker": WORKER_CONCURRENCY,
+            "queue_depth": sum(worker["queued"] for worker in workers),
+            "running": sum(worker["running"] for worker in workers),
+            "per_worker": workers,
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        lines = ["# TYPE imooc_worker_queue_depth gauge"]
+        lines.extend(f'imooc_worker_queue_depth{{worker="{w.index}"}} {w.queued}' for w in self.workers)
+        lines.append("# TYPE imooc_worker_running gauge")
+        lines.extend(f'imooc_worker_running{{worker="{w.index}"}} {w.running}' for w in self.workers)
+        lines.append("# TYPE imooc_worker_calls_total counter")
+        for w in self.workers:
+            lines.append(f'imooc_worker_calls_total{{worker="{w.index}",result="ok"}} {w.completed}')
+            lines.append(f'imooc_worker_calls_total{{worker="{w.index}",result="error"}} {w.failed}')
+        return lines
+
+    async def close(self):
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+
+async def serve_worker(tools: Dict[str, Callable[..., Awaitable[Any]]]):
+    """
+    工作进程主循环：从标准输入逐行读取 {"id", "tool", "args"} 请求并发执行，
+    结果以 {"id", "result"} 或 {"id", "error"} 写回标准输出；标准输入关闭后退出。
+    """
+    # 协议独占原标准输出，其余输出（含子进程输出）改写到标准错误
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    loop = asyncio.get_running_loop()
+    tasks = {}
+
+    def reply(message: Dict):
+        protocol.write(json.dumps(message, ensure_ascii=False) + "\n")
+        protocol.flush()
+
+    async def run(request_id: int, tool: str, args: Dict[str, Any]):
+        try:
+            result = await tools[tool](**args)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            reply({"id": request_id, "error": f"{type(e).__name__}: {str(e)}"})
+        else:
+            reply({"id": request_id, "result": result})
+        finally:
+            tasks.pop(request_id, None)
+
+    logger.info("[工作进程] %s 已就绪（pid %d）", os.environ.get("WORKER_ID", "?"), os.getpid())
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.buffer.readline)
+        if not line:
+            break
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        if "cancel" in request:
+            task: Optional[asyncio.Task] = tasks.get(request["cancel"])
+            if task is not None:
+                task.cancel()
+            continue
+        tasks[request["id"]] = asyncio.create_task(run(request["id"], request["tool"], request.get("args", {})))
+
+    for task in list(tasks.values()):
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)